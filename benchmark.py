@@ -0,0 +1,273 @@
+"""
+性能基准：生成可复现的合成词库，分阶段计时，并端到端运行 jd-dict-converter.py
+
+用法：
+    python benchmark.py                      # 默认 1k、10k、100k 三档
+    python benchmark.py --sizes 1k,1m        # 指定规模
+    python benchmark.py --save-baseline      # 把本次结果保存为基线
+
+存在基线文件时，任何阶段（或端到端耗时、峰值内存）比基线差超过 --tolerance，以返回码 1 退出。
+基线与机器有关，请在同一台机器上保存和比较。
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+import jd_converter as jd
+
+here = os.path.dirname(os.path.abspath(__file__))
+converter_path = os.path.join(here, 'jd-dict-converter.py')
+baseline_file = os.path.join(here, 'benchmark_baseline.json')
+# 转换所需的数据文件，复制到临时目录中使用
+data_files = ['jdx.csv', 'py2jd.txt', 'jdpy.csv']
+
+# 各阶段，顺序与 jd_converter.py 的流水线一致
+stages = ['load_tables', 'dict_scan', 'prefilter', 'annotation', 'flying_keys', 'syllable_encoding', 'allocation']
+
+# 合成词组的词长分布
+word_lengths = {2: 60, 3: 20, 4: 15, 5: 3, 6: 2}
+
+# 阶段耗时低于该秒数时不判断退步，避免计时噪声
+min_delta = 0.05
+
+
+def parse_size(text):
+    """'10k'、'1m'、'5000' → 词数"""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def size_label(n):
+    """词数 → '10k' 这样的标签"""
+    if n % 1000000 == 0:
+        return f'{n // 1000000}m'
+    if n % 1000 == 0:
+        return f'{n // 1000}k'
+    return str(n)
+
+
+def corpus_chars():
+    """合成词组用的字：(普通字, 飞键字)，都取自 jdx.csv；飞键字是单音字拼音表中读 ch/zh/sh + uang 的字"""
+    shape_chars = sorted(ch for ch in jd.load_shape_codes(os.path.join(here, 'jdx.csv')) if len(ch) == 1)
+    fj_chars = set()
+    with open(os.path.join(here, jd.char_table_file), 'r', encoding='UTF-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) == 2:
+                s, u = parts[1].split('\'', 1)
+                if s in jd.fj_shengmu and u in jd.fj_yunmu_1:
+                    fj_chars.add(parts[0])
+    plain = [ch for ch in shape_chars if ch not in fj_chars]
+    return plain, sorted(ch for ch in shape_chars if ch in fj_chars)
+
+
+def generate_words(n, rng, plain, fj_chars, fj_share):
+    """生成 n 个合成词组，其中约 fj_share 比例的词组含一个飞键字"""
+    lengths = list(word_lengths)
+    weights = [word_lengths[length] for length in lengths]
+    for _ in range(n):
+        length = rng.choices(lengths, weights)[0]
+        word = [rng.choice(plain) for _ in range(length)]
+        if rng.random() < fj_share:
+            word[rng.randrange(length)] = rng.choice(fj_chars)
+        yield ''.join(word)
+
+
+def write_corpus(workdir, n, seed, fj_share):
+    """在 workdir 中写入 All.txt 和同规模的已有词库 bench.dict.yaml，返回 All.txt 中的词组"""
+    rng = random.Random(seed)
+    plain, fj_chars = corpus_chars()
+    words = list(generate_words(n, rng, plain, fj_chars, fj_share))
+    with open(os.path.join(workdir, 'All.txt'), 'w', encoding='UTF-8-SIG') as f:
+        f.writelines(word + '\n' for word in words)
+
+    # 已有词库：另外生成的词组加上 All.txt 中每 10 个词取 1 个，编码随机
+    existing = list(generate_words(n, rng, plain, fj_chars, fj_share)) + words[::10]
+    with open(os.path.join(workdir, 'bench.dict.yaml'), 'w', encoding='UTF-8') as f:
+        f.write('---\nname: bench\nversion: "v1"\nsort: original\n...\n')
+        for word in existing:
+            code = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.choice((3, 4, 4, 4))))
+            f.write(f'{word}\t{code}\n')
+
+    for name in data_files:
+        shutil.copy(os.path.join(here, name), workdir)
+    return words
+
+
+def time_stages(words):
+    """在当前目录下逐阶段运行流水线，每个阶段完整收集结果后再进入下一阶段，返回 ({阶段: 秒}, 输出词条数)"""
+    timings = {}
+
+    def run(stage, func):
+        start = time.perf_counter()
+        result = func()
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    char_table, table_1, table_2, dictx = run('load_tables', jd.load_tables)
+    # 删除索引，计入逐行解析已有词库的时间
+    shutil.rmtree(jd.index_dir, ignore_errors=True)
+    bm_set, zc_set = run('dict_scan', jd.load_existing)
+    allocator = jd.CodeAllocator(bm_set, zc_set, dictx=dictx)
+    words = run('prefilter', lambda: list(allocator.prefilter(words, set())))
+    records = run('annotation', lambda: list(jd.annotate(words, char_table)))
+    records = run('flying_keys', lambda: list(jd.split_flying_keys(records)))
+    records = run('syllable_encoding', lambda: list(jd.to_codes(jd.encode(records, table_1, table_2))))
+    entries = run('allocation', lambda: list(allocator.allocate_all(records)))
+    return timings, len(entries)
+
+
+def run_converter(workdir, extra_args=()):
+    """在 workdir 中端到端运行 jd-dict-converter.py，返回 (秒, 峰值内存字节数)，不支持统计内存的平台上为 None"""
+    shutil.rmtree(os.path.join(workdir, '.dict_index'), ignore_errors=True)
+    command = [sys.executable, converter_path, '--no-cache'] + list(extra_args)
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL)
+    if hasattr(os, 'wait4'):
+        _, status, usage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - start
+        proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 1
+        # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+        peak = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    else:
+        proc.wait()
+        elapsed = time.perf_counter() - start
+        peak = None
+    if proc.returncode:
+        raise RuntimeError(f'jd-dict-converter.py 运行失败，返回码 {proc.returncode}')
+    return elapsed, peak
+
+
+def count_entries(path):
+    """result.dict.yaml 中的词条数"""
+    with open(path, 'r', encoding='UTF-8') as f:
+        return sum(1 for line in f if '\t' in line)
+
+
+def bench_size(n, args):
+    """对一个规模运行 args.repeat 次，各项取最好成绩"""
+    with tempfile.TemporaryDirectory(prefix='jd-bench-') as workdir:
+        words = write_corpus(workdir, n, args.seed, args.fj_share)
+        best = dict.fromkeys(stages, float('inf'))
+        end_to_end, peak = float('inf'), None
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for _ in range(args.repeat):
+                timings, entries = time_stages(words)
+                for stage, seconds in timings.items():
+                    best[stage] = min(best[stage], seconds)
+        finally:
+            os.chdir(cwd)
+        for _ in range(args.repeat):
+            elapsed, rss = run_converter(workdir, args.converter_args)
+            end_to_end = min(end_to_end, elapsed)
+            peak = rss if peak is None or rss is None else min(peak, rss)
+        # 分阶段与端到端走的是同一套代码，输出条数应当一致
+        if count_entries(os.path.join(workdir, 'result.dict.yaml')) != entries:
+            raise RuntimeError('端到端结果与分阶段结果的词条数不一致')
+
+    return {
+        'words': n,
+        'entries': entries,
+        'stages': best,
+        'end_to_end': end_to_end,
+        'words_per_sec': n / end_to_end,
+        'peak_rss': peak,
+    }
+
+
+def print_result(label, result):
+    print(f"规模 {label}：{result['words']} 词，输出 {result['entries']} 条")
+    for stage in stages:
+        seconds = result['stages'][stage]
+        print(f'  {stage:<18} {seconds:8.3f}s  {result["words"] / seconds if seconds else 0:12.0f} 词/秒')
+    peak = result['peak_rss']
+    memory = f'{peak / (1 << 20):.1f} MB' if peak is not None else '未知'
+    print(f"  {'端到端':<15} {result['end_to_end']:8.3f}s  {result['words_per_sec']:12.0f} 词/秒  峰值内存 {memory}")
+
+
+def compare(results, baseline, tolerance):
+    """与基线比较，返回退步项的说明列表"""
+    failures = []
+    for label, result in results.items():
+        base = baseline['results'].get(label)
+        if base is None:
+            continue
+        timings = dict(result['stages'], end_to_end=result['end_to_end'])
+        base_timings = dict(base['stages'], end_to_end=base['end_to_end'])
+        for stage, seconds in timings.items():
+            old = base_timings.get(stage)
+            if old is not None and seconds > old * (1 + tolerance) and seconds - old > min_delta:
+                failures.append(f'{label} {stage}: {old:.3f}s → {seconds:.3f}s')
+        if result['peak_rss'] and base.get('peak_rss') and result['peak_rss'] > base['peak_rss'] * (1 + tolerance):
+            failures.append(f"{label} 峰值内存: {base['peak_rss'] / (1 << 20):.1f} MB → "
+                            f"{result['peak_rss'] / (1 << 20):.1f} MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='jd-dict-converter.py 性能基准')
+    parser.add_argument('--sizes', default='1k,10k,100k',
+                        help='合成词库的规模，逗号分隔，如 1k,10k,100k,1m（默认 1k,10k,100k）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子（默认 1），相同种子生成相同的词库')
+    parser.add_argument('--fj-share', type=float, default=0.05,
+                        help='含 ch/zh/sh + uang 飞键字的词组比例（默认 0.05）')
+    parser.add_argument('--repeat', type=int, default=1, help='每个规模重复运行的次数，取最好成绩（默认 1）')
+    parser.add_argument('--baseline', default=baseline_file, help='基线文件（默认 benchmark_baseline.json）')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线，不做比较')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许比基线慢的比例（默认 0.25）')
+    parser.add_argument('--json', metavar='PATH', help='把结果写入 JSON 文件')
+    parser.add_argument('converter_args', nargs='*', metavar='ARG',
+                        help='端到端运行时传给 jd-dict-converter.py 的参数，写在 -- 之后，如 -- --jobs 4')
+    args = parser.parse_args()
+
+    # 先加载 pypinyin 的数据，各规模的注音阶段都不计入这部分启动时间
+    jd.word_pinyin('键道')
+
+    results = {}
+    for n in (parse_size(size) for size in args.sizes.split(',')):
+        label = size_label(n)
+        results[label] = bench_size(n, args)
+        print_result(label, results[label])
+
+    report = {'seed': args.seed, 'fj_share': args.fj_share, 'converter_args': args.converter_args, 'results': results}
+    if args.json:
+        with open(args.json, 'w', encoding='UTF-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='UTF-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'已保存基线 {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, 'r', encoding='UTF-8') as f:
+        baseline = json.load(f)
+    if (baseline.get('seed'), baseline.get('fj_share'), baseline.get('converter_args')) != \
+            (args.seed, args.fj_share, args.converter_args):
+        print('提示：基线的参数（种子、飞键比例、转换参数）与本次不同，不做比较')
+        return 0
+    failures = compare(results, baseline, args.tolerance)
+    if failures:
+        print(f'性能退步（超过基线 {args.tolerance:.0%}）：')
+        for failure in failures:
+            print('  ' + failure)
+        return 1
+    print('与基线相比没有退步')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
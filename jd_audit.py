@@ -0,0 +1,152 @@
+"""
+audit 模式：按当前的取码规则、飞键表和 jdx.csv 重新编码已有词库中的每个词条，找出编码不符的词条
+
+由 python jd-dict-converter.py audit 启动。逐个词库流式读取 ... 之后的词条（跳过 #region 简 等，
+规则同转换时读取已有词库），分批交给进程池重新编码。编码须是某个重新算出的全码（音码 + 形码）
+从 3 码（三字词）或 4 码（其它）起的前缀，否则视为不符。
+"""
+
+import collections
+import os
+import time
+
+from jd_converter import _worker, chunked, encode_pool, existing_dicts, init_worker, shape_suffix, scan_dict
+
+chunk_size = 5000  # 每批交给进程池的词条数
+
+
+def shape_chars(word):
+    """形码用到的字：三字词取前三字，其余取前两字"""
+    return word[:3] if len(word) == 3 else word[:2]
+
+
+def check_entry(word, code, sound_codes, dictx):
+    """校验一个词条，返回 (结果, 全码列表)；结果为 'ok'、'drift'（不符）或 'missing_shape'（缺少形码，无法校验形码部分）"""
+    min_length = 3 if len(word) == 3 else 4
+    suffix = shape_suffix(word, dictx)
+    full_codes = sound_codes if suffix is None else [sound + suffix for sound in sound_codes]
+    if len(code) >= min_length:
+        for full in full_codes:
+            if full.startswith(code):
+                return 'ok', full_codes
+    if suffix is None:
+        for sound in sound_codes:
+            if len(code) > len(sound) and code.startswith(sound):
+                return 'missing_shape', full_codes
+    return 'drift', full_codes
+
+
+def audit_chunk(entries):
+    """在进程池中校验一批 (行号, 字词, 编码)，返回 (计数, 不符的词条, 缺少形码的字)"""
+    tables, cache = _worker['tables'], _worker['cache']
+    dictx = tables[3]
+    counts = collections.Counter()
+    drift = []
+    missing_chars = collections.Counter()
+
+    # 同一字词只编码一次；一字词没有音码，含 ASCII 字符的（英文、A股 等）不按拼音取码，都不校验
+    words = list(dict.fromkeys(word for _, word, _ in entries if len(word) > 1 and not any(ch.isascii() for ch in word)))
+    sound_codes = {}
+    for word, code in _worker['encode'](words, tables, cache, counters=collections.Counter()):
+        sound_codes.setdefault(word, []).append(code)
+    if cache is not None:
+        cache.flush()
+
+    for lineno, word, code in entries:
+        sounds = sound_codes.get(word)
+        if sounds is None:
+            counts['unchecked'] += 1
+            continue
+        result, full_codes = check_entry(word, code, sounds, dictx)
+        counts[result] += 1
+        if result == 'drift':
+            drift.append((lineno, word, code, full_codes))
+        elif result == 'missing_shape':
+            missing_chars.update(ch for ch in shape_chars(word) if ch not in dictx)
+    return counts, drift, missing_chars
+
+
+def audit_results(chunks, pool, jobs):
+    """按顺序产出各批的校验结果；jobs > 1 时最多同时提交 2 * jobs 批，避免一次读入整个词库"""
+    if pool is None:
+        yield from map(audit_chunk, chunks)
+        return
+    pending = collections.deque()
+    for chunk in chunks:
+        pending.append(pool.apply_async(audit_chunk, (chunk,)))
+        if len(pending) >= 2 * jobs:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def audit_file(filename, pool, jobs, limit, out=None):
+    """校验一个词库，打印汇总和前 limit 条不符的词条，返回 (计数, 缺少形码的字)"""
+    name = os.path.basename(filename)
+    start = time.perf_counter()
+    counts = collections.Counter()
+    missing_chars = collections.Counter()
+    shown = []
+    for chunk_counts, drift, chunk_missing in audit_results(chunked(scan_dict(filename, True), chunk_size), pool, jobs):
+        counts.update(chunk_counts)
+        missing_chars.update(chunk_missing)
+        for lineno, word, code, full_codes in drift:
+            if len(shown) < limit:
+                shown.append((lineno, word, code, full_codes))
+            if out is not None:
+                out.write(f"{name}\t{lineno}\t{word}\t{code}\t{'/'.join(full_codes)}\n")
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed else 0
+    print(f"{name}：{total} 条，不符 {counts['drift']} 条，缺少形码 {counts['missing_shape']} 条，"
+          f"未校验 {counts['unchecked']} 条（{elapsed:.2f} 秒，{rate:.0f} 条/秒）")
+    for lineno, word, code, full_codes in shown:
+        print(f"  第 {lineno} 行\t{word}\t{code}\t全码 {'/'.join(full_codes)}")
+    if counts['drift'] > len(shown):
+        print(f'  ……（只显示前 {len(shown)} 条）')
+    return counts, missing_chars
+
+
+def audit(files=(), jobs=None, use_cache=True, engine='python', limit=20, output=None):
+    """audit 命令：逐个校验词库（默认目录下所有已有的 .dict.yaml），可把全部不符的词条写入 output"""
+    files = list(files) or existing_dicts()
+    if not files:
+        print('没有要校验的 .dict.yaml')
+        return
+    jobs = jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    counts = collections.Counter()
+    missing_chars = collections.Counter()
+
+    pool = None
+    if jobs > 1:
+        pool = encode_pool(jobs, use_cache, engine)
+    else:
+        init_worker(use_cache, engine)
+    out = open(output, 'w', encoding='utf-8') if output else None
+    try:
+        if out is not None:
+            out.write('词库\t行号\t字词\t编码\t全码\n')
+        for filename in files:
+            file_counts, file_missing = audit_file(filename, pool, jobs, limit, out)
+            counts.update(file_counts)
+            missing_chars.update(file_missing)
+    finally:
+        if out is not None:
+            out.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif _worker['cache'] is not None:
+            _worker['cache'].close()
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"共 {len(files)} 个词库 {total} 条，不符 {counts['drift']} 条，缺少形码 {counts['missing_shape']} 条，"
+          f"未校验 {counts['unchecked']} 条（{elapsed:.2f} 秒，{jobs} 个进程）")
+    if missing_chars:
+        chars = ''.join(ch for ch, _ in missing_chars.most_common(20))
+        print(f'jdx.csv 中没有的字：{chars}')
+    if output:
+        print(f'不符的词条已写入 {output}')
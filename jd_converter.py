@@ -0,0 +1,1701 @@
+# All.txt，存放需要转换的词组，每行一词，支持两种格式：
+#   1. 纯词组：每行一个词组
+#   2. 词组+编码：词组\t编码（只提取词组部分）
+# jdx.csv，单字的首笔形码，用的 RIME_JD 的单字码表
+# result.dict.yaml，最后得到的键道音形码词库
+#
+# 各处理阶段（去掉已有和重复的词组 → 注音 → 提取飞键 → 双拼编码 → 取码 → 添加形码 → 分配编码）
+# 以生成器的形式在内存中逐条传递，不再落地中间文件。
+# 调试时可加 --dump-intermediates 参数，把各阶段结果写到 pinyin.csv、jdf.csv 等中间文件。
+#
+# 本模块可以直接 import，不会改动任何文件；命令行入口是 jd-dict-converter.py。
+# 需要在一个进程中反复转换多批词组时，使用 JDConverter，编码表和已有词库只加载一次：
+#
+#     with JDConverter() as converter:
+#         converter.encode('键道')                    # [('键道', 'jdde', 'jddeab'), ...]
+#         for word, code in converter.allocate(words):
+#             ...
+
+# 导入需要的模块
+import argparse
+import collections
+import contextlib
+import functools
+import glob
+import hashlib
+import heapq
+import importlib.util
+import marshal
+import mmap
+import pickle
+import shutil
+import sqlite3
+import struct
+import sys
+import time
+import re, csv, os
+from array import array
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块，运行报告中不统计峰值内存
+    resource = None
+
+# 中间文件，每次运行前删除；结果先写入临时文件，转换完成后才替换上次的结果
+output_file = './result.dict.yaml'
+output_tmp_file = output_file + '.tmp'
+state_file = './result.state'
+checkpoint_file = './result.checkpoint'
+file_list = ['jdAll.csv', 'jdAllx.csv', 'jdf.csv', 'jdy.csv', 'jdyf.csv', 'pinyin.csv', '已有字词.txt', '已有编码.txt']
+
+# 注音缓存文件，以词组为键，pypinyin 版本变化时自动失效
+pinyin_cache_file = 'pinyin_cache.db'
+
+# jdx.csv 中单音字的拼音表（字\t声母'韵母），由 --build-char-table 生成
+char_table_file = 'jdpy.csv'
+char_table_header = '# pypinyin '  # 表的第一行：生成它的 pypinyin 版本
+
+# 由 py2jd.txt、jdx.csv、jdpy.csv 预编译的编码表（marshal 格式），源文件内容变化时自动重建
+tables_file = './.jd_tables.bin'
+tables_version = 1
+
+# 准备把全拼转成键道双拼
+# 声母按长度从长到短排列，便于从全拼中切分出声母
+shengmu_list = ['zh', 'ch', 'sh', 'b', 'p', 'm', 'f', 'd', 't', 'n', 'l', 'g', 'k', 'h', 'j', 'q', 'x', 'r', 'z', 'c', 's', 'y', 'w']
+dict1 = {'j': 'jl', 'q': 'ql', 'x': 'xl', 'y': 'yl'}  # j/q/x/y + u(ü) 的特殊编码，零声母统一用 x 引导
+dict2 = {'iu':'q', 'ua':'q', 'ei':'w', 'un':'w', 'e':'e', 'eng':'r', 'uan':'t', 'iong':'y', 'ong':'y', 'ang':'p', 'a':'s', 'ia':'s', 'ie':'d', 'ou':'d', 'an':'f', 'ing':'g', 'uai':'g', 'ai':'h', 'ue':'h', 've':'h', 'er':'j', 'u':'j', 'i':'k', 'o':'l', 'uo':'l', 'v':'l', 'ao':'z', 'iang':'x', 'uang':'x', 'iao':'c', 'in':'b', 'ui':'b', 'en':'n', 'n':'n', 'ian':'m'} # 韵母
+
+# 固定飞键（ch/zh/sh 声母按韵母分到不同键位，sh 一律为 e）
+fj_shengmu = {
+    'ch': dict.fromkeys(['u', 'ai', 'ao', 'an', 'ang', 'en', 'eng', 'un'], 'j'),
+    'zh': dict.fromkeys(['u', 'ai', 'ao', 'an', 'ang', 'ei', 'en', 'eng', 'un'], 'q'),
+    'sh': {},
+}
+fj_shengmu['ch'].update(dict.fromkeys(['a', 'e', 'i', 'ong', 'ou', 'ua', 'uai', 'uan', 'uang', 'ui', 'uo'], 'w'))
+fj_shengmu['zh'].update(dict.fromkeys(['a', 'e', 'i', 'ong', 'ou', 'ua', 'uai', 'uan', 'uang', 'ui', 'uo'], 'f'))
+
+# 飞键韵母的两种编码(关键是 ch/zh/sh + uang 的双编码)
+fj_yunmu_1 = {'uang': 'm'}  # 飞键韵母变体1(uang→m)
+fj_yunmu_2 = {'uang': 'x'}  # 飞键韵母变体2(uang→x)
+
+
+def split_pinyin(py):
+    """把全拼切分为 (声母, 韵母)，零声母的声母为空；ü 统一写作 v，与 pypinyin 一致"""
+    py = py.replace('ü', 'v')
+    for sm in shengmu_list:
+        if py.startswith(sm) and len(py) > len(sm):
+            return sm, py[len(sm):]
+    return '', py
+
+
+def syllable_to_jd(sm, ym, fj_yunmu):
+    """按规则把一个 (声母, 韵母) 转为键道双拼，用于 py2jd.txt 中没有的音节"""
+    if sm == '':
+        sy = 'x'
+    elif sm in dict1 and ym == 'u':
+        return dict1[sm]
+    elif sm == 'sh':
+        sy = 'e'
+    elif sm in fj_shengmu:
+        sy = fj_shengmu[sm].get(ym, sm)
+    else:
+        sy = sm
+    if sm in fj_shengmu and ym in fj_yunmu:
+        return sy + fj_yunmu[ym]
+    if ym in dict2:
+        return sy + dict2[ym]
+    # 未知韵母，保持原样
+    return sy + '\'' + ym
+
+
+def load_syllable_tables(path='py2jd.txt'):
+    """由 py2jd.txt 和飞键规则生成 (声母, 韵母) → 键道双拼 查找表，返回 (变体1表, 变体2表)"""
+    table = {}
+    with open(path, 'r', encoding='UTF-8') as f:
+        for line in f:
+            parts = line.strip().split('\t')
+            if len(parts) != 2:
+                continue
+            # 同一音节出现多次时（飞键双编码），以第一次为准，飞键另行处理
+            table.setdefault(split_pinyin(parts[0]), parts[1])
+
+    table_1 = dict(table)
+    table_2 = dict(table)
+    for (sm, ym), jd in table.items():
+        if sm in fj_shengmu and ym in fj_yunmu_1:
+            table_1[(sm, ym)] = jd[0] + fj_yunmu_1[ym]
+            table_2[(sm, ym)] = jd[0] + fj_yunmu_2[ym]
+    return table_1, table_2
+
+
+def dump(records, filename, fmt, enabled, encoding='UTF-8'):
+    """调试用：开启 --dump-intermediates 时，把流经的记录同时写入中间文件"""
+    if not enabled:
+        yield from records
+        return
+    with open(filename, 'w', encoding=encoding) as f:
+        for record in records:
+            f.write(fmt(record))
+            yield record
+
+
+def timed(records, stage, report):
+    """开启 --report 时，统计流经该阶段的记录条数和耗时"""
+    return records if report is None else report.stage(stage, records)
+
+
+def segment_bounds(path, start, end, size):
+    """把 All.txt 的 [start, end) 字节在行尾处切成约 size 字节的若干段，size 为 0 时不切分"""
+    if not size:
+        yield start, end
+        return
+    with open(path, 'rb') as f:
+        pos = start
+        while pos + size < end:
+            f.seek(pos + size)
+            f.readline()
+            boundary = f.tell()
+            if boundary >= end:
+                break
+            yield pos, boundary
+            pos = boundary
+    yield pos, end
+
+
+def parse_weight(fields):
+    """制表符分隔的各字段中词组之后第一个数字为权重（搜狗、QQ 等导出的"词组\t权重"），没有时返回 None"""
+    for field in fields[1:]:
+        field = field.strip()
+        # 编码是字母，不能让 float() 把 nan、inf 之类当作数字
+        if not field[:1].isdigit() and field[:1] not in ('-', '+', '.'):
+            continue
+        try:
+            return int(field)
+        except ValueError:
+            pass
+        try:
+            return float(field)
+        except ValueError:
+            pass
+    return None
+
+
+def read_entries(path='./All.txt', start=0, end=None, counters=None):
+    """逐行读取 All.txt 从 start 到 end 字节之间的内容，产出 (词组, 权重)，没有权重时为 None
+
+    支持"词组"、"词组\t编码"、"词组\t权重"和"词组\t编码\t权重"等格式，编码不使用。
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        for raw in f:
+            if end is not None and pos >= end:
+                break
+            # 文件开头可能带 BOM
+            line = raw.decode('UTF-8-SIG' if pos == 0 else 'UTF-8')
+            pos += len(raw)
+            line = line.rstrip()
+            if counters is not None:
+                counters['input_lines'] += 1
+            if not line:  # 跳过空行
+                if counters is not None:
+                    counters['blank_lines'] += 1
+                continue
+            # 如果包含制表符，第一部分为词组，其后的数字为权重
+            if '\t' in line:
+                fields = line.split('\t')
+                weight = parse_weight(fields)
+                if weight is not None and counters is not None:
+                    counters['weighted_lines'] += 1
+                yield fields[0], weight
+            else:
+                yield line, None
+
+
+def entry_words(entries, weights=None):
+    """(词组, 权重) → 词组；weights 不为 None 时把各词组（规整后）第一次出现时的权重记入其中"""
+    for word, weight in entries:
+        if weight is not None and weights is not None:
+            weights.setdefault(word.replace('\ufeff', '').strip(), weight)
+        yield word
+
+
+def read_words(path='./All.txt', start=0, end=None, counters=None, weights=None):
+    """逐行读取 All.txt 中的词组，权重记入 weights（见 entry_words）"""
+    return entry_words(read_entries(path, start, end, counters), weights)
+
+
+def select_words(entries, top=None, min_weight=None, counters=None):
+    """从 (词组, 权重) 中选出权重最高的 top 个、权重不低于 min_weight 的，读完全部输入后按权重从高到低产出
+
+    没有权重的词组按 0 比较，权重相同时保持输入顺序。只保留 top 个时用小顶堆，内存与 top 成正比。
+    """
+    heap = []
+    for seq, (word, weight) in enumerate(entries):
+        value = weight or 0
+        if min_weight is not None and value < min_weight:
+            if counters is not None:
+                counters['not_selected'] += 1
+            continue
+        # 堆顶是权重最低、同权重中最靠后的词组；seq 各不相同，不会比较到后面的元素
+        item = (value, -seq, word, weight)
+        if top is None:
+            heap.append(item)
+        elif len(heap) < top:
+            heapq.heappush(heap, item)
+        else:
+            if counters is not None:
+                counters['not_selected'] += 1
+            if item > heap[0]:
+                heapq.heapreplace(heap, item)
+    heap.sort(reverse=True)
+    for _, _, word, weight in heap:
+        yield word, weight
+
+
+def word_pinyin(ci):
+    """使用 pypinyin 为一个词组注音，返回 ((声母, 韵母), ...)（不使用多音字，避免pypinyin数据错误）"""
+    # 只有含多音字或表外字的词组才会走到这里，此时才加载 pypinyin 的词语数据
+    from pypinyin import lazy_pinyin, Style
+
+    # 使用默认读音（不使用heteronym，避免错误读音）
+    sh = lazy_pinyin(ci, style=Style.INITIALS, strict=False, errors='ignore')
+    un = lazy_pinyin(ci, style=Style.FINALS, strict=False, errors='ignore')
+    return tuple(zip(sh, un))
+
+
+def pypinyin_version():
+    """pypinyin 的版本号，尽量不导入 pypinyin 本身（导入 pypinyin 或 importlib.metadata 都要几十毫秒以上）"""
+    try:
+        # 直接从 pypinyin/__init__.py 中读出 __version__
+        with open(importlib.util.find_spec('pypinyin').origin, 'r', encoding='utf-8') as f:
+            match = re.search(r'^__version__\s*=\s*[\'"]([^\'"]+)', f.read(), re.M)
+        if match:
+            return match.group(1)
+    except (AttributeError, TypeError, OSError, ValueError):
+        # 打包成 exe 等情况下找不到源文件
+        pass
+    import pypinyin
+    return pypinyin.__version__
+
+
+def load_char_table(path=char_table_file):
+    """读取单音字拼音表，返回 (起始码位, 码位偏移 → 读音序号的数组, 读音列表)，序号 0 表示不在表中
+
+    表的第一行记录生成它的 pypinyin 版本，与已安装的版本不同时不使用这个表（所有词组都经 pypinyin 注音）。
+    """
+    chars = {}
+    version = None
+    if os.path.exists(path):
+        with open(path, 'r', encoding='UTF-8') as f:
+            for line in f:
+                if line.startswith(char_table_header):
+                    version = line[len(char_table_header):].strip()
+                    continue
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) == 2 and len(parts[0]) == 1:
+                    chars[ord(parts[0])] = tuple(parts[1].split('\'', 1))
+    if chars and version != pypinyin_version():
+        print(f'提示：{path} 由 pypinyin {version or "未知版本"} 生成，与已安装的 {pypinyin_version()} 不同，'
+              f'暂不使用；请运行 --build-char-table 重新生成')
+        chars = {}
+    if not chars:
+        return 0, array('H'), [None]
+
+    base = min(chars)
+    syllables = [None] + sorted(set(chars.values()))
+    numbers = {sy: i for i, sy in enumerate(syllables)}
+    index = array('H', bytes(2 * (max(chars) - base + 1)))
+    for cp, sy in chars.items():
+        index[cp - base] = numbers[sy]
+    return base, index, syllables
+
+
+def table_pinyin(ci, char_table):
+    """用单音字拼音表为词组注音，有字不在表中（多音字、表外字、符号等）时返回 None"""
+    base, index, syllables = char_table
+    size = len(index)
+    result = []
+    for ch in ci:
+        offset = ord(ch) - base
+        if offset < 0 or offset >= size or not index[offset]:
+            return None
+        result.append(syllables[index[offset]])
+    return tuple(result)
+
+
+def build_char_table(path=char_table_file, shape_path='jdx.csv'):
+    """维护用：由 pypinyin 数据为 jdx.csv 中的单字生成单音字拼音表（pypinyin 升级后重新生成）"""
+    from pypinyin import Style
+    from pypinyin.pinyin_dict import pinyin_dict
+    from pypinyin.phrases_dict import phrases_dict
+    from pypinyin.style import convert
+
+    def toneless(py):
+        return convert(py, Style.INITIALS, False), convert(py, Style.FINALS, False)
+
+    # 收集每个字在单字数据和词语数据中的所有读音（不计声调）
+    readings = {}
+    for ch in load_shape_codes(shape_path):
+        if len(ch) == 1 and ord(ch) in pinyin_dict:
+            readings[ch] = {toneless(py) for py in pinyin_dict[ord(ch)].split(',')}
+    for phrase, pys in phrases_dict.items():
+        for ch, py in zip(phrase, pys):
+            if ch in readings:
+                readings[ch].add(toneless(py[0]))
+
+    count = 0
+    with open(path, 'w', encoding='UTF-8') as f:
+        f.write(f'{char_table_header}{pypinyin_version()}\n')
+        for ch in sorted(readings):
+            # 只收录读音唯一、且与 pypinyin 默认注音一致的字
+            if len(readings[ch]) == 1 and readings[ch] == set(word_pinyin(ch)):
+                s, u = word_pinyin(ch)[0]
+                f.write(f"{ch}\t{s}'{u}\n")
+                count += 1
+    return count
+
+
+class PinyinCache:
+    """注音缓存：sqlite 持久化 + 进程内 LRU，pypinyin 版本变化时整体失效"""
+
+    commit_every = 10000  # 每新增多少条提交一次
+
+    def __init__(self, path=pinyin_cache_file, maxsize=65536):
+        # 多进程转换时各进程共用同一个缓存文件，WAL 模式下读写互不阻塞
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS pinyin (word TEXT PRIMARY KEY, syllables TEXT)')
+        version = pypinyin_version()
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'pypinyin'").fetchone()
+        if row is None or row[0] != version:
+            # pypinyin 升级后读音数据可能变化，清空旧缓存
+            self.conn.execute('DELETE FROM pinyin')
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('pypinyin', ?)", (version,))
+            self.conn.commit()
+        self.pending = 0
+        # All.txt 中重复的词组直接命中进程内缓存
+        self.get = functools.lru_cache(maxsize=maxsize)(self._get)
+
+    def _get(self, ci):
+        row = self.conn.execute('SELECT syllables FROM pinyin WHERE word = ?', (ci,)).fetchone()
+        if row is not None:
+            return tuple(tuple(sy.split('\'', 1)) for sy in row[0].split('\t')) if row[0] else ()
+        syllables = word_pinyin(ci)
+        self.conn.execute('INSERT OR REPLACE INTO pinyin VALUES (?, ?)',
+                          (ci, '\t'.join(s + '\'' + u for s, u in syllables)))
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.flush()
+        return syllables
+
+    def flush(self):
+        if self.pending:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def annotate(words, char_table, cache=None):
+    """为词组注音，产出 (词组, ((声母, 韵母), ...))：只含单音字的直接查表，其余查缓存或用 pypinyin"""
+    lookup = cache.get if cache is not None else word_pinyin
+    for ci in words:
+        if not ci:  # 跳过空词
+            continue
+        syllables = table_pinyin(ci, char_table)
+        yield ci, syllables if syllables is not None else lookup(ci)
+
+
+def pinyin_line(word, syllables):
+    """注音行，格式同 pinyin.csv：词组\t声母'韵母\t……"""
+    return word + '\t' + ''.join(s + '\'' + u + '\t' for s, u in syllables) + '\n'
+
+
+def jd_line(word, codes):
+    """键道双拼行，格式同 jdy.csv：词组\t双拼\t……"""
+    return word + '\t' + ''.join(c + '\t' for c in codes) + '\n'
+
+
+def split_flying_keys(records, counters=None):
+    """标记需要双编码的飞键词组，产出 (词组, 注音, 是否飞键)
+
+    只有二字词的音码用到韵母（2+2），三字及以上只取各字声母，ch/zh/sh + 'uang 的两种编码相同，不必再编一次。
+    """
+    for word, syllables in records:
+        is_fj = len(syllables) == 2 and any(s in fj_shengmu and u in fj_yunmu_1 for s, u in syllables)
+        if is_fj and counters is not None:
+            counters['flying_key_words'] += 1
+        yield word, syllables, is_fj
+
+
+def encode_syllables(syllables, table, fj_yunmu):
+    """逐音节查表转为键道双拼，表中没有的音节按规则算出后补入表中"""
+    codes = []
+    for key in syllables:
+        jd = table.get(key)
+        if jd is None:
+            jd = table[key] = syllable_to_jd(key[0], key[1], fj_yunmu)
+        codes.append(jd)
+    return codes
+
+
+def process_row_to_code(row):
+    """将 CSV 行转换为编码"""
+    if len(row) == 3:  # 二字词
+        try:
+            sy1 = row[1][:2]
+            sy2 = row[2][:2]
+            return sy1+sy2
+        except:
+            return None
+    elif len(row) == 4:  # 三字词
+        try:
+            s1 = row[1][:1]
+            s2 = row[2][:1]
+            s3 = row[3][:1]
+            return s1+s2+s3
+        except:
+            return None
+    elif len(row) == 5:  # 四字词
+        try:
+            s1 = row[1][:1]
+            s2 = row[2][:1]
+            s3 = row[3][:1]
+            s4 = row[4][:1]
+            return s1+s2+s3+s4
+        except:
+            return None
+    elif len(row) > 5:  # 五字及以上词
+        try:
+            s1 = row[1][:1]
+            s2 = row[2][:1]
+            s3 = row[3][:1]
+            s4 = row[-1][:1]  # 最后一个字
+            return s1+s2+s3+s4
+        except:
+            return None
+    return None
+
+
+def encode(records, table_1, table_2):
+    """把注音转为键道双拼，产出 (词组, 标准双拼(m变体), 飞键双拼(x变体)或 None)，飞键词组在同一遍中编出两种"""
+    for word, syllables, is_fj in records:
+        codes_jdyf = encode_syllables(syllables, table_2, fj_yunmu_2) if is_fj else None
+        yield word, encode_syllables(syllables, table_1, fj_yunmu_1), codes_jdyf
+
+
+def to_codes(records, counters=None):
+    """取音码，产出 (词组, 编码)：先标准编码，飞键编码紧跟在标准编码后面"""
+    for word, codes_jdy, codes_jdyf in records:
+        word = word.replace('\ufeff', '').strip()
+        code_jdy = process_row_to_code([word] + codes_jdy)
+        if code_jdy:
+            yield word, code_jdy
+        if codes_jdyf is not None:
+            code_jdyf = process_row_to_code([word] + codes_jdyf)
+            # 只有当编码不同时才输出飞键编码
+            if code_jdyf and code_jdyf != (code_jdy or ''):
+                if counters is not None:
+                    counters['flying_key_variants'] += 1
+                yield word, code_jdyf
+
+
+def load_shape_codes(path='jdx.csv'):
+    """将首笔对应码转为字典"""
+    dictx = {}
+    with open(path, 'r', encoding='UTF-8') as f:
+        reader = csv.reader(f, dialect=csv.excel_tab)
+        for row in reader:
+            dictx[row[0]] = row[1]
+    return dictx
+
+
+def shape_suffix(word, dictx):
+    """词组的形码部分：三字词取前三字、其余取前两字的首笔形码，有字不在形码表中时返回 None"""
+    # 最核心、最常用的词库可以不加形码以降低码长
+    try:
+        if len(word) == 3:
+            return dictx[word[0]] + dictx[word[1]] + dictx[word[2]]
+        return dictx[word[0]] + dictx[word[1]]
+    except (KeyError, IndexError):
+        return None
+
+
+def full_code(word, code, dictx):
+    """音码加上形码的 6 码全码，字不在形码表中时为 None"""
+    suffix = shape_suffix(word, dictx)
+    return None if suffix is None else code + suffix
+
+
+def append_shape_codes(records, dictx):
+    """添加形码，产出 (词组, 音码, 音形码)，字不在形码表中时音形码为 None"""
+    for word, code in records:
+        yield word, code, full_code(word, code, dictx)
+
+
+def compile_tables():
+    """由源文件生成编码所需的各种表，返回 (单音字拼音表, 双拼变体1表, 双拼变体2表, 首笔形码表)"""
+    table_1, table_2 = load_syllable_tables()
+    return load_char_table(), table_1, table_2, load_shape_codes()
+
+
+def tables_checksum():
+    """各源文件内容和 pypinyin 版本的校验和，文件不存在时按空文件计"""
+    h = hashlib.blake2b(digest_size=16)
+    # 单音字拼音表是否可用取决于 pypinyin 版本
+    h.update(pypinyin_version().encode() + b'\0')
+    for path in ('py2jd.txt', 'jdx.csv', char_table_file):
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        h.update(b'\0')
+    return h.digest()
+
+
+def load_tables():
+    """读取编码所需的各种表，返回 (单音字拼音表, 双拼变体1表, 双拼变体2表, 首笔形码表)
+
+    优先读取预编译的 .jd_tables.bin，比逐行解析源文件快得多；不存在或源文件有变化时重新生成。
+    """
+    checksum = tables_checksum()
+    try:
+        with open(tables_file, 'rb') as f:
+            version, saved_checksum, tables = marshal.loads(f.read())
+        if (version, saved_checksum) == (tables_version, checksum):
+            (base, index_bytes, syllables), table_1, table_2, dictx = tables
+            index = array('H')
+            index.frombytes(index_bytes)
+            return (base, index, syllables), table_1, table_2, dictx
+    except (OSError, EOFError, ValueError, TypeError):
+        # 文件不存在、已损坏或由其他版本的 Python 生成
+        pass
+
+    tables = compile_tables()
+    (base, index, syllables), table_1, table_2, dictx = tables
+    try:
+        tmp = tables_file + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(marshal.dumps((tables_version, checksum, ((base, index.tobytes(), syllables), table_1, table_2, dictx))))
+        os.replace(tmp, tables_file)
+    except OSError:
+        # 目录不可写时只是下次仍要重新生成
+        pass
+    return tables
+
+
+def encode_words(words, tables, cache=None, dump_intermediates=False, counters=None, report=None):
+    """逐词编码：注音 → 提取飞键 → 双拼编码 → 取码，产出 (词组, 音码)；形码在分配编码需要时才查"""
+    char_table, table_1, table_2, _ = tables
+    records = annotate(words, char_table, cache)
+    records = dump(records, 'pinyin.csv', lambda r: pinyin_line(*r), dump_intermediates)
+    records = timed(records, 'annotation', report)
+    records = split_flying_keys(records, counters)
+    records = dump(records, 'jdf.csv', lambda r: pinyin_line(r[0], r[1]) if r[2] else '', dump_intermediates)
+    records = timed(records, 'flying_keys', report)
+    records = encode(records, table_1, table_2)
+    records = dump(records, 'jdy.csv', lambda r: jd_line(r[0], r[1]), dump_intermediates, 'UTF-8-sig')
+    records = dump(records, 'jdyf.csv', lambda r: jd_line(r[0], r[2]) if r[2] is not None else '', dump_intermediates, 'UTF-8-sig')
+    records = to_codes(records, counters)
+    return timed(records, 'syllable_encoding', report)
+
+
+def load_engine(name):
+    """逐词编码的实现：'python' 为 encode_words，'numpy' 为 jd_numpy 中的向量化版本（需要安装 numpy）"""
+    if name == 'numpy':
+        import jd_numpy
+        return jd_numpy.encode_words
+    return encode_words
+
+
+# 进程池中每个进程各自加载的表和注音缓存
+_worker = {}
+
+
+def init_worker(use_cache, engine='python'):
+    """进程池初始化：加载编码表，打开注音缓存"""
+    _worker['tables'] = load_tables()
+    _worker['cache'] = PinyinCache() if use_cache else None
+    _worker['encode'] = load_engine(engine)
+
+
+def encode_chunk(words):
+    """在进程池中编码一批词组，返回 (结果, 计数)"""
+    cache = _worker['cache']
+    counters = collections.Counter()
+    result = list(_worker['encode'](words, _worker['tables'], cache, counters=counters))
+    if cache is not None:
+        cache.flush()
+    return result, counters
+
+
+def chunked(iterable, size):
+    """把词组流切分为每批 size 个"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def encode_pool(jobs, use_cache, engine='python'):
+    """编码用的进程池，各进程加载一次编码表；分段转换时各段共用"""
+    import multiprocessing
+
+    return multiprocessing.Pool(jobs, init_worker, (use_cache, engine))
+
+
+def parallel_encode_words(words, pool, jobs, chunk_size=2000, counters=None):
+    """用 encode_pool() 的进程池分批编码，按 All.txt 的原始顺序产出结果，与单进程完全一致"""
+    def collect(result):
+        records, chunk_counters = result.get()
+        if counters is not None:
+            counters.update(chunk_counters)
+        return records
+
+    # 最多同时提交 2 * jobs 批，避免一次读入整个 All.txt
+    pending = collections.deque()
+    for chunk in chunked(words, chunk_size):
+        pending.append(pool.apply_async(encode_chunk, (chunk,)))
+        if len(pending) >= 2 * jobs:
+            yield from collect(pending.popleft())
+    while pending:
+        yield from collect(pending.popleft())
+
+
+#####################
+### Added by Ivan ###
+#####################
+
+output_zc_file = "./已有字词.txt"
+output_bm_file = "./已有编码.txt"
+
+
+def existing_dicts():
+    """目录下所有已有的 .dict.yaml（不含本程序输出的 result.dict.yaml 和分片词库）"""
+    return [filename for filename in sorted(glob.glob('./*.dict.yaml'))
+            if os.path.basename(filename) != os.path.basename(output_file)
+            and not os.path.basename(filename).startswith(dict_name + '.')]
+
+
+def scan_dict(filename, line_numbers=False):
+    """逐行解析一个 .dict.yaml，产出 (字词, 编码)；line_numbers 为真时产出 (行号, 字词, 编码)"""
+    # 打开yaml文件
+    with open(filename, 'r', encoding='utf-8') as infile:
+        # 标记是否在需要跳过的 region 内部
+        in_skip_region = False
+        separator_found = False
+
+        for lineno, line in enumerate(infile, 1):
+            stripped = line.strip()
+            # 检测到 ... 分隔符
+            if stripped == '...':
+                separator_found = True
+                continue
+
+            # 只处理 ... 之后的内容
+            if not separator_found:
+                continue
+
+            if stripped.startswith('#'):
+                # 检测需要跳过的 #region（简字、简码等）
+                # 只跳过包含"简"字的 region
+                if stripped.startswith('#region') and '简' in line:
+                    in_skip_region = True
+                # 检测 #endregion 结束
+                elif stripped.startswith('#endregion'):
+                    in_skip_region = False
+                # 跳过普通注释行和 region 标记行
+                continue
+
+            # 在需要跳过的 region 内部，跳过
+            if in_skip_region:
+                continue
+
+            # 含制表符的行（即原来的正则 ^.*\t[a-z]*，[a-z]* 可以为空），产出字词和编码
+            if '\t' in line:
+                parts = line.split("\t")
+                if line_numbers:
+                    yield lineno, parts[0].strip(), parts[1].strip()
+                else:
+                    yield parts[0].strip(), parts[1].strip()
+
+
+def hash64(text):
+    """字符串的 64 位指纹（不为 0），跨进程、跨运行保持不变"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+class HashSet:
+    """以 64 位指纹为元素的开放寻址哈希集合，槽位可以是 array('Q')，也可以是 mmap 中的一段（只读）
+
+    每个元素只占 8 字节（装载率 1/2 时约 16 字节），低内存模式下代替 Python 的 set 记录去重和已占用的编码。
+    """
+
+    def __init__(self, slots=None, count=0):
+        self.slots = array('Q', bytes(8 * 8)) if slots is None else slots
+        self.mask = len(self.slots) - 1
+        self.count = count
+
+    @classmethod
+    def build(cls, items):
+        """由字符串集合建表，装载率不超过 1/2"""
+        size = 8
+        while size < 2 * len(items):
+            size *= 2
+        hash_set = cls(array('Q', bytes(8 * size)))
+        for item in items:
+            hash_set.add_hash(hash64(item))
+        return hash_set
+
+    def add_hash(self, h):
+        slots, mask = self.slots, self.mask
+        i = h & mask
+        while slots[i]:
+            if slots[i] == h:
+                return
+            i = (i + 1) & mask
+        slots[i] = h
+        self.count += 1
+        if 2 * self.count > len(slots):
+            self._grow()
+
+    def _grow(self):
+        """扩容一倍并重新插入"""
+        old = self.slots
+        self.slots = array('Q', bytes(16 * len(old)))
+        self.mask = len(self.slots) - 1
+        self.count = 0
+        for h in old:
+            if h:
+                self.add_hash(h)
+
+    def add(self, text):
+        self.add_hash(hash64(text))
+
+    def contains_hash(self, h):
+        slots, mask = self.slots, self.mask
+        i = h & mask
+        while True:
+            slot = slots[i]
+            if slot == h:
+                return True
+            if not slot:
+                return False
+            i = (i + 1) & mask
+
+    def __contains__(self, text):
+        return self.contains_hash(hash64(text))
+
+
+class DictIndex:
+    """一个 .dict.yaml 的编译索引：编码、字词各一张哈希表，外加排序去重后的原文（以换行分隔）"""
+
+    def __init__(self, codes, words, codes_blob, words_blob, n_codes, n_words, mm=None):
+        self.codes = codes
+        self.words = words
+        self.codes_blob = codes_blob
+        self.words_blob = words_blob
+        self.n_codes = n_codes
+        self.n_words = n_words
+        self.mm = mm  # 保持 mmap 打开
+
+    def code_list(self):
+        """排序后的全部编码"""
+        return bytes(self.codes_blob).decode('utf-8').split('\n') if self.n_codes else []
+
+    def word_list(self):
+        """排序后的全部字词"""
+        return bytes(self.words_blob).decode('utf-8').split('\n') if self.n_words else []
+
+
+class ExistingSet:
+    """多个词库索引中编码（或字词）的并集，支持 in 判断和遍历"""
+
+    def __init__(self, hash_sets, lists):
+        self.hash_sets = hash_sets
+        self.lists = lists
+
+    def __contains__(self, text):
+        h = hash64(text)
+        for hash_set in self.hash_sets:
+            if hash_set.contains_hash(h):
+                return True
+        return False
+
+    def __iter__(self):
+        seen = set()
+        for get_list in self.lists:
+            for item in get_list():
+                if item not in seen:
+                    seen.add(item)
+                    yield item
+
+
+# 每个 .dict.yaml 编译成一个索引文件，通过 mmap 直接使用，不必重新解析、建集合
+# 源文件大小或修改时间变化时自动重建；解析规则（如 #region 简 的跳过规则）变化时需提升 index_version
+index_dir = './.dict_index'
+index_magic = b'JDIX'
+index_version = 2
+# 标识、版本、源文件大小、源文件修改时间、编码数、字词数、编码表槽数、字词表槽数、编码区长度、字词区长度
+index_header = struct.Struct('<4sIQqIIQQQQ')
+
+
+def dict_index_path(filename):
+    """.dict.yaml 对应的索引文件路径"""
+    return os.path.join(index_dir, os.path.basename(filename) + '.idx')
+
+
+def build_dict_index(filename, st):
+    """解析 .dict.yaml 并写入索引文件"""
+    codes, words = set(), set()
+    for word, code in scan_dict(filename):
+        codes.add(code)
+        words.add(word)
+    code_table = HashSet.build(codes)
+    word_table = HashSet.build(words)
+    codes_blob = '\n'.join(sorted(codes)).encode('utf-8')
+    words_blob = '\n'.join(sorted(words)).encode('utf-8')
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = dict_index_path(filename)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(index_header.pack(index_magic, index_version, st.st_size, st.st_mtime_ns, len(codes), len(words),
+                                  len(code_table.slots), len(word_table.slots), len(codes_blob), len(words_blob)))
+        code_table.slots.tofile(f)
+        word_table.slots.tofile(f)
+        f.write(codes_blob)
+        f.write(words_blob)
+    os.replace(tmp, path)
+    return DictIndex(code_table, word_table, codes_blob, words_blob, len(codes), len(words))
+
+
+def load_dict_index(filename):
+    """通过 mmap 读取 .dict.yaml 的索引，索引缺失或过期时重建"""
+    st = os.stat(filename)
+    try:
+        with open(dict_index_path(filename), 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, size, mtime_ns, n_codes, n_words,
+         code_slots, word_slots, codes_len, words_len) = index_header.unpack_from(mm)
+        if (magic, version, size, mtime_ns) == (index_magic, index_version, st.st_size, st.st_mtime_ns):
+            view = memoryview(mm)
+            pos = index_header.size
+            code_table = HashSet(view[pos:pos + 8 * code_slots].cast('Q'))
+            pos += 8 * code_slots
+            word_table = HashSet(view[pos:pos + 8 * word_slots].cast('Q'))
+            pos += 8 * word_slots
+            codes_blob = view[pos:pos + codes_len]
+            words_blob = view[pos + codes_len:pos + codes_len + words_len]
+            return DictIndex(code_table, word_table, codes_blob, words_blob, n_codes, n_words, mm)
+        mm.close()
+    except (OSError, ValueError, struct.error):
+        # 索引不存在或已损坏，重建
+        pass
+    return build_dict_index(filename, st)
+
+
+def load_existing(dump_intermediates=False):
+    """获取目录下所有 .dict.yaml 中已有的编码和字词，返回 (bm_set, zc_set)"""
+    # 遍历目录下的所有yaml文件
+    indexes = [load_dict_index(filename) for filename in existing_dicts()]
+    bm_set = ExistingSet([index.codes for index in indexes], [index.code_list for index in indexes])
+    zc_set = ExistingSet([index.words for index in indexes], [index.word_list for index in indexes])
+
+    if dump_intermediates:
+        with open(output_bm_file, 'w', encoding='utf-8') as outfile_bm, open(output_zc_file, 'w', encoding='utf-8') as outfile_zc:
+            outfile_bm.writelines(bm + '\n' for bm in bm_set)
+            outfile_zc.writelines(zc + '\n' for zc in zc_set)
+    return bm_set, zc_set
+
+
+class CodeAllocator:
+    """编码分配器：3字词 3码空码动态匹配到 6 码，其它 4码空码动态匹配到 6 码
+
+    当前转换中已使用的编码按码长分桶记录，一次调用即可找到全码中最短的空闲前缀，
+    同时统计各码长的冲突次数（该码位已被占用而顺延）。
+    """
+
+    max_length = 6
+    # 断点中保存的统计
+    stat_fields = ('collisions', 'allocated', 'overflow', 'excluded', 'shape_lookups', 'missing_shape', 'missing_chars')
+
+    def __init__(self, bm_set, zc_set, entries=None, taken=None, set_factory=set, dictx=None):
+        self.bm_set = bm_set  # .dict.yaml 中已有的编码
+        self.zc_set = zc_set  # .dict.yaml 中已有的字词
+        self.dictx = {} if dictx is None else dictx  # 单字 → 首笔形码
+        self.set_factory = set_factory  # 低内存模式下为 HashSet
+        self.entries = set_factory() if entries is None else entries  # 已输出的词条，用于去重检查
+        self.taken = {} if taken is None else taken  # 码长 → 当前转换中已使用的编码
+        self.collisions = dict.fromkeys(range(3, self.max_length + 1), 0)  # 码长 → 冲突次数
+        self.allocated = dict.fromkeys(range(3, self.max_length + 1), 0)  # 码长 → 分配到该码长的词条数
+        self.overflow = 0  # 各码位都被占用、放在 6 码位置的重码词条数
+        self.excluded = 0  # 已存在于 .dict.yaml 中而排除的词组数
+        self.shape_lookups = 0  # 音码已被占用、需要查形码的词条数
+        self.missing_shape = 0  # 需要形码但有字不在形码表中而跳过的词条数
+        self.missing_chars = collections.Counter()  # 缺少形码的字 → 次数
+
+    def prefilter(self, words, seen_words, counters=None, weighted=False):
+        """注音之前去掉已有词库中已有的词组和输入中重复的词组，之后的各阶段只处理可能输出的词组
+
+        同一词组的编码总是相同，重复出现时产出的词条都会被去掉，所以按词组去重与按词条去重的结果相同。
+        weighted 为 True 时输入和产出都是 (词组, 权重)。
+        """
+        zc_set = self.zc_set
+        for item in words:
+            word = item[0] if weighted else item
+            # 与 to_codes 相同的规整
+            key = word.replace('\ufeff', '').strip()
+            # 跳过分隔行
+            if key.startswith('#'):
+                continue
+            if key in zc_set:
+                self.excluded += 1
+                continue
+            if key in seen_words:
+                if counters is not None:
+                    counters['duplicates'] += 1
+                continue
+            seen_words.add(key)
+            yield item
+
+    def free_prefix(self, full_code, min_length):
+        """全码中从 min_length 码起最短的空闲前缀，都被占用时返回 None"""
+        bm_set, taken = self.bm_set, self.taken
+        for n in range(min_length, self.max_length + 1):
+            code = full_code[:n]
+            bucket = taken.get(len(code))
+            if code not in bm_set and (bucket is None or code not in bucket):
+                return code
+            self.collisions[n] += 1
+        return None
+
+    def lookup_shape(self, word):
+        """查词组的形码部分，有字不在形码表中时返回 None，并记下缺少的字"""
+        self.shape_lookups += 1
+        suffix = shape_suffix(word, self.dictx)
+        if suffix is None:
+            self.missing_shape += 1
+            for ch in word[:3 if len(word) == 3 else 2]:
+                if ch not in self.dictx:
+                    self.missing_chars[ch] += 1
+        return suffix
+
+    def allocate(self, word, code):
+        """为一个词组的音码分配编码，返回 (词组, 编码)；已有该词组、重复或需要形码而缺少形码时返回 None
+
+        音码（3字词 3 码，其它 4 码）空闲时直接使用，被占用时才查形码，顺延到 5、6 码。
+        """
+        # 核心排除逻辑：如果词组已存在于 .dict.yaml 中，直接跳过整个词组（经过 prefilter 的词组已排除过）
+        if word in self.zc_set:
+            self.excluded += 1
+            return None
+
+        # 检查编码是否在 .dict.yaml 或当前转换中已存在，如果存在就顺延
+        min_length = 3 if len(word) == 3 else 4
+        start = min_length
+        if len(code) >= min_length:
+            # 音码空闲的常见情况，不查形码
+            short_code = code[:min_length]
+            bucket = self.taken.get(min_length)
+            if short_code not in self.bm_set and (bucket is None or short_code not in bucket):
+                return self.take(word, short_code)
+            self.collisions[min_length] += 1
+            start = min_length + 1
+        suffix = self.lookup_shape(word)
+        if suffix is None:
+            return None
+        full_code = code + suffix
+        short_code = self.free_prefix(full_code, start)
+        if short_code is None:
+            # 各码位都被占用（.dict.yaml或当前转换中），放在6码位置（允许重码）
+            code = full_code[:self.max_length]
+            entry = f"{word}\t{code}"
+            if entry in self.entries:
+                return None
+            self.entries.add(entry)
+            self.overflow += 1
+            return word, code
+        return self.take(word, short_code)
+
+    def take(self, word, code):
+        """占用编码，返回 (词组, 编码)；词条已输出过时返回 None"""
+        entry = f"{word}\t{code}"
+        if entry in self.entries:
+            return None
+        self.entries.add(entry)
+        bucket = self.taken.get(len(code))
+        if bucket is None:
+            bucket = self.taken[len(code)] = self.set_factory()
+        bucket.add(code)
+        self.allocated[len(code)] = self.allocated.get(len(code), 0) + 1
+        return word, code
+
+    def allocate_all(self, records):
+        """为 (词组, 音码) 流批量分配编码，按输入顺序产出 (词组, 编码)"""
+        allocate = self.allocate
+        for word, code in records:
+            result = allocate(word, code)
+            if result is not None:
+                yield result
+
+    def summary(self):
+        """分配结果统计"""
+        total = sum(self.allocated.values()) + self.overflow
+        lengths = '，'.join(f'{n}码 {count}' for n, count in self.allocated.items())
+        collisions = '，'.join(f'{n}码 {count}' for n, count in self.collisions.items())
+        return (f'共输出 {total} 条词条（{lengths}，重码 {self.overflow}），排除已有词组 {self.excluded} 条\n'
+                f'编码冲突（码位已被占用而顺延）：{collisions}')
+
+
+dict_name = 'xkjd6.result'
+
+
+def dict_header(name, import_tables=()):
+    """Rime 词库文件的头部，import_tables 为要导入的词库名"""
+    imports = ''.join(f'  - {table}\n' for table in import_tables)
+    return f'---\nname: {name}\nversion: "v1"\nsort: original\n' + (f'import_tables:\n{imports}' if imports else '') + '...\n'
+
+
+content = dict_header(dict_name)
+
+
+#####################
+###   分片输出    ###
+#####################
+
+# 分片输出的目录：一个只含 import_tables 的主词库加上各分片词库，部署时 Rime 只重新编译有变化的分片
+shard_dir = './rime_dicts'
+shard_modes = {
+    'length': (lambda code: f'len{len(code)}', [f'len{n}' for n in range(3, 7)]),  # 按码长
+    'letter': (lambda code: code[0], list('abcdefghijklmnopqrstuvwxyz')),  # 按首码
+}
+
+
+def replace_if_changed(tmp, path):
+    """内容与 path 不同时用 tmp 原子地替换 path，相同时删除 tmp 而不改动 path；返回是否替换了"""
+    if os.path.exists(path) and os.path.getsize(path) == os.path.getsize(tmp) and file_digest(path) == file_digest(tmp):
+        os.remove(tmp)
+        return False
+    os.replace(tmp, path)
+    return True
+
+
+def write_shards(mode, path=output_file, directory=shard_dir, name=dict_name):
+    """把 result.dict.yaml 的词条按码长或首码分到固定的几个分片词库中，并生成导入各分片的主词库
+
+    分片的划分固定不变（没有词条的分片也会生成），同一编码的词条总在同一分片中、保持原顺序。
+    各文件先写临时文件，内容有变化时才替换；返回有变化的文件列表。
+    """
+    shard_key, keys = shard_modes[mode]
+    keys = list(keys)
+    os.makedirs(directory, exist_ok=True)
+    files = {}
+
+    def shard_file(key):
+        f = files.get(key)
+        if f is None:
+            f = files[key] = open(os.path.join(directory, f'{name}.{key}.dict.yaml.tmp'), 'w', encoding='utf-8')
+            f.write(dict_header(f'{name}.{key}'))
+        return f
+
+    try:
+        for key in keys:
+            shard_file(key)
+        with open(path, 'r', encoding='utf-8') as f:
+            # 跳过头部
+            for line in f:
+                if line.strip() == '...':
+                    break
+            for line in f:
+                # 第三列可能是权重
+                parts = line.rstrip('\n').split('\t')
+                code = parts[1] if len(parts) > 1 else ''
+                key = shard_key(code) if code else 'other'
+                if key not in files:
+                    # 不在预设分片中的编码（一般不会出现）放到额外的分片
+                    keys.append(key)
+                shard_file(key).write(line)
+    finally:
+        for f in files.values():
+            f.close()
+
+    changed = []
+    for key in keys:
+        target = os.path.join(directory, f'{name}.{key}.dict.yaml')
+        if replace_if_changed(target + '.tmp', target):
+            changed.append(target)
+    target = os.path.join(directory, f'{name}.dict.yaml')
+    with open(target + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(dict_header(name, [f'{name}.{key}' for key in keys]))
+    if replace_if_changed(target + '.tmp', target):
+        changed.append(target)
+
+    # 删除换了划分方式后不再导入的旧分片
+    current = {f'{name}.{key}.dict.yaml' for key in keys}
+    for old in glob.glob(os.path.join(glob.escape(directory), f'{glob.escape(name)}.*.dict.yaml')):
+        if os.path.basename(old) not in current:
+            os.remove(old)
+            changed.append(old)
+    return changed
+
+
+class JDConverter:
+    """可导入的转换器：编码表、已有词库和注音缓存只加载一次，可以反复转换多批词组
+
+    allocate() 在各次调用之间保留去重和编码占用的状态，多批词组依次分配的结果
+    与把它们合并成一个 All.txt 转换的结果相同。
+    """
+
+    def __init__(self, use_cache=True, low_memory=False, existing=True, state=None, engine='python'):
+        self.tables = load_tables()
+        self.encode_words = load_engine(engine)
+        self.cache = PinyinCache() if use_cache else None
+        if existing:
+            bm_set, zc_set = load_existing()
+        else:
+            bm_set, zc_set = set(), set()
+        set_factory = HashSet if low_memory else set
+        # 去重和编码占用的状态，格式同增量转换的状态，可以用 save_state() 保存
+        self.state = new_state(None, set_factory) if state is None else state
+        self.allocator = CodeAllocator(bm_set, zc_set, self.state['entries'], self.state['taken'], set_factory,
+                                       self.tables[3])
+        self.counters = collections.Counter()
+
+    def encode(self, word):
+        """为一个词组编码，返回 [(词组, 音码, 音形码或 None), ...]，含飞键时有两条"""
+        return list(self.encode_many([word]))
+
+    def encode_many(self, words):
+        """逐个编码词组，产出 (词组, 音码, 音形码或 None)，不去重、不分配编码"""
+        return append_shape_codes(self.encode_words(words, self.tables, self.cache, counters=self.counters),
+                                  self.tables[3])
+
+    def allocate(self, words):
+        """为词组去重、分配编码，按输入顺序产出 (词组, 编码)；已有词库中的词组和重复的词组不产出"""
+        words = self.allocator.prefilter(words, self.state['seen_words'], self.counters)
+        records = self.encode_words(words, self.tables, self.cache, counters=self.counters)
+        yield from self.allocator.allocate_all(records)
+
+    def allocate_batch(self, words):
+        """为一批词组分配编码，按输入顺序返回每个词组分到的编码列表，已有或重复的词组为空列表"""
+        # 与 to_codes 相同的规整，保证产出的词组能对应回输入
+        words = [word.replace('\ufeff', '').strip() for word in words]
+        results = [[] for _ in words]
+        i = 0
+        for word, code in self.allocate(words):
+            # 产出按输入顺序排列，同一词组的各条编码相邻
+            while words[i] != word:
+                i += 1
+            results[i].append(code)
+        return results
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+#####################
+###   运行报告    ###
+#####################
+
+def peak_rss(children=False):
+    """本进程（或已结束的子进程中最大）的峰值内存字节数，不支持的平台上为 None"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+class RunReport:
+    """--report 的运行报告：各步骤、各阶段的耗时和峰值内存，各项计数，可选的 cProfile 结果
+
+    流水线的各阶段逐条交替运行，阶段耗时由包装生成器统计：先计入含上游在内的累计耗时，
+    输出时再减去上游阶段的累计耗时。峰值内存只能按步骤（读取词库、流水线等）统计。
+    """
+
+    def __init__(self, profile=False):
+        self.started = time.perf_counter()
+        self.phases = {}  # 步骤 → {'seconds', 'peak_rss'}
+        self.stages = {}  # 阶段 → [含上游的累计耗时, 产出条数, 上游阶段]
+        self.last_stage = None
+        self.counters = collections.Counter()
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        else:
+            self.profiler = None
+
+    @contextlib.contextmanager
+    def phase(self, name, profile=False):
+        """统计一个步骤的耗时；profile 为真且开启了 cProfile 时，同时采集该步骤"""
+        profiler = self.profiler if profile else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            seconds = time.perf_counter() - start
+            # 同一步骤多次执行（如各段之后的断点）时累计
+            if name in self.phases:
+                seconds += self.phases[name]['seconds']
+            self.phases[name] = {'seconds': seconds, 'peak_rss': peak_rss()}
+
+    def stage(self, name, records):
+        """包装流水线中的一个阶段，须按流水线的顺序调用；分段转换时同名阶段的各段累计"""
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = [0.0, 0, self.last_stage]
+        self.last_stage = name
+        return self._timed(records, stats)
+
+    @staticmethod
+    def _timed(records, stats):
+        clock = time.perf_counter
+        records = iter(records)
+        while True:
+            start = clock()
+            try:
+                record = next(records)
+            except StopIteration:
+                stats[0] += clock() - start
+                return
+            stats[0] += clock() - start
+            stats[1] += 1
+            yield record
+
+    def profile_top(self, limit=30):
+        """cProfile 结果中自身耗时最多的函数"""
+        import pstats
+
+        stats = pstats.Stats(self.profiler)
+        stats.sort_stats('tottime')
+        top = []
+        for func in stats.fcn_list[:limit]:
+            primitive_calls, calls, tottime, cumtime, _ = stats.stats[func]
+            top.append({'function': pstats.func_std_string(func), 'calls': calls,
+                        'tottime': round(tottime, 6), 'cumtime': round(cumtime, 6)})
+        return top
+
+    def to_dict(self, allocator, **info):
+        """汇总为可写成 JSON 的字典"""
+        wall = time.perf_counter() - self.started
+        words = self.counters['input_lines'] - self.counters['blank_lines']
+        stages = {}
+        for name, (seconds, count, upstream) in self.stages.items():
+            if upstream is not None:
+                seconds -= self.stages[upstream][0]
+            stages[name] = {'seconds': round(max(seconds, 0.0), 6), 'records': count}
+        report = dict(info)
+        report.update({
+            'wall_seconds': round(wall, 6),
+            'words': words,
+            'words_per_sec': round(words / wall, 1) if wall else None,
+            'entries': sum(allocator.allocated.values()) + allocator.overflow,
+            'peak_rss': peak_rss(),
+            'peak_rss_workers': peak_rss(children=True) if info.get('jobs', 1) > 1 else None,
+            'phases': {name: dict(phase, seconds=round(phase['seconds'], 6)) for name, phase in self.phases.items()},
+            'stages': stages,
+            'counters': dict(self.counters, excluded_existing=allocator.excluded, overflow=allocator.overflow,
+                             shape_lookups=allocator.shape_lookups, missing_shape_code=allocator.missing_shape),
+            'allocated': allocator.allocated,
+            'collisions': allocator.collisions,
+            'missing_chars': dict(allocator.missing_chars.most_common()),
+        })
+        return report
+
+    def write(self, path, allocator, **info):
+        """写入 JSON 报告；开启了 cProfile 时，同时把原始数据写到同名的 .prof 文件"""
+        import json
+
+        report = self.to_dict(allocator, **info)
+        if self.profiler is not None:
+            profile_file = os.path.splitext(path)[0] + '.prof'
+            self.profiler.dump_stats(profile_file)
+            report['profile'] = {'file': profile_file, 'top': self.profile_top()}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+#####################
+###   增量转换    ###
+#####################
+
+state_version = 5
+
+
+def file_digest(path, size=None):
+    """文件（或其前 size 字节）的 sha1"""
+    h = hashlib.sha1()
+    remaining = os.path.getsize(path) if size is None else size
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            block = f.read(min(1 << 20, remaining))
+            if not block:
+                break
+            h.update(block)
+            remaining -= len(block)
+    return h.hexdigest()
+
+
+def sources_fingerprint():
+    """影响编码结果的输入：已有词库、各编码表和 pypinyin 版本，任何一项变化都要全量重新转换"""
+    items = [state_version, pypinyin_version()]
+    for path in ('jdx.csv', 'py2jd.txt', char_table_file):
+        items.append((path, file_digest(path) if os.path.exists(path) else None))
+    for filename in existing_dicts():
+        st = os.stat(filename)
+        items.append((filename, st.st_size, st.st_mtime_ns))
+    return repr(items)
+
+
+def new_state(fingerprint, set_factory=set):
+    """全量转换的初始状态"""
+    return {
+        'version': state_version,
+        'fingerprint': fingerprint,
+        'offset': 0,  # All.txt 已处理到的字节位置
+        'digest': None,  # All.txt 已处理部分的 sha1
+        'seen_words': set_factory(),  # 已处理的词组
+        'entries': set_factory(),  # 已输出的词条
+        'taken': {},  # 码长 → 已使用的编码
+        'output_size': None,  # 对应的 result.dict.yaml 的字节数
+    }
+
+
+def read_state(path, fingerprint):
+    """读取状态文件；文件缺失、损坏或输入源有变化时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except Exception:
+        return None
+    if state.get('version') != state_version or state.get('fingerprint') != fingerprint:
+        return None
+    return state
+
+
+def load_state(fingerprint, input_path='./All.txt'):
+    """读取上次的增量转换状态；结果文件缺失或与状态不符、输入源有变化、All.txt 不是在末尾追加时返回 None"""
+    if not os.path.exists(output_file):
+        return None
+    state = read_state(state_file, fingerprint)
+    if state is None or state.get('output_size') != os.path.getsize(output_file):
+        return None
+
+    offset = state['offset']
+    size = os.path.getsize(input_path)
+    if size < offset or file_digest(input_path, offset) != state['digest']:
+        return None
+    # 上次最后一行没有换行符时，新追加的内容会接在这一行后面，只能全量转换
+    if size > offset and offset > 0:
+        with open(input_path, 'rb') as f:
+            f.seek(offset - 1)
+            if f.read(1) not in (b'\n', b'\r'):
+                return None
+    return state
+
+
+def save_state(state, path=state_file):
+    """原子地写入增量转换状态（或断点）"""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # 断电后也不会留下只写了一半的文件
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(fingerprint, input_path='./All.txt'):
+    """读取中断的转换留下的断点；断点与临时结果文件不符、输入源有变化、All.txt 已处理的部分有改动时返回 None
+
+    断点是转换状态加上 output_size（临时结果文件中已写入的字节数）、counters、allocator（分配统计）。
+    """
+    checkpoint = read_state(checkpoint_file, fingerprint)
+    if checkpoint is None or not os.path.exists(output_tmp_file):
+        return None
+    if os.path.getsize(output_tmp_file) < checkpoint['output_size']:
+        return None
+    offset = checkpoint['offset']
+    if os.path.getsize(input_path) < offset or file_digest(input_path, offset) != checkpoint['digest']:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(state, outfile, counters, allocator, input_path='./All.txt'):
+    """已处理到 state['offset'] 时写入断点，此前的词条已全部写入临时结果文件"""
+    outfile.flush()
+    os.fsync(outfile.fileno())
+    checkpoint = dict(state, output_size=os.path.getsize(output_tmp_file), counters=counters,
+                      allocator={name: getattr(allocator, name) for name in allocator.stat_fields})
+    checkpoint['digest'] = file_digest(input_path, state['offset'])
+    save_state(checkpoint, checkpoint_file)
+
+
+# 长时间转换时，All.txt 每处理这么多兆字节（约 25 万个二字词）写一次断点
+checkpoint_mb = 2
+
+
+# serve 模式的编码分配状态文件，服务本身在 jd_server.py 中
+serve_state_file = './serve.state'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='将 All.txt 中的词组转换为键道音形码词库 result.dict.yaml')
+    parser.add_argument('--dump-intermediates', action='store_true',
+                        help='调试用：把各阶段结果写入 pinyin.csv、jdf.csv、jdy.csv、jdyf.csv、jdAll.csv、jdAllx.csv 等中间文件')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'不使用注音缓存 {pinyin_cache_file}，每个词组都重新注音')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'增量转换：只转换 All.txt 中上次之后追加的行并追加到结果，状态保存在 {state_file}')
+    parser.add_argument('--low-memory', action='store_true',
+                        help='低内存模式：去重和已占用的编码只记录 64 位指纹，适合百万级词库')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='用 N 个进程并行编码（默认 1），结果与单进程完全相同')
+    parser.add_argument('--report', nargs='?', const='report.json', metavar='PATH',
+                        help='把各阶段耗时、峰值内存和各项计数写成 JSON 运行报告（默认 report.json）')
+    parser.add_argument('--profile', action='store_true',
+                        help='同时用 cProfile 采集转换流水线，结果写入报告及同名的 .prof 文件（隐含 --report）')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default='python',
+                        help='编码引擎（默认 python）；numpy 为向量化的批量编码，需要安装 numpy，适合大词库')
+    parser.add_argument('--checkpoint-every', type=float, default=checkpoint_mb, metavar='MB',
+                        help=f'All.txt 每处理约 MB 兆字节写一次断点 {checkpoint_file}（默认 {checkpoint_mb:g}，0 为不写）')
+    parser.add_argument('--resume', action='store_true',
+                        help='从上次中断时的断点继续转换，结果与不中断时完全相同；没有可用的断点时从头转换')
+    parser.add_argument('--top', type=int, metavar='N',
+                        help='All.txt 带权重（"词组+权重"格式）时只转换权重最高的 N 个新词组，按权重从高到低分配编码')
+    parser.add_argument('--min-weight', type=float, metavar='W',
+                        help='只转换权重不低于 W 的新词组（没有权重的按 0 计），按权重从高到低分配编码')
+    parser.add_argument('--shard', choices=sorted(shard_modes),
+                        help=f'另外把结果按码长（length）或首码（letter）分成固定的几个分片词库，连同导入它们的主词库 '
+                             f'{dict_name}.dict.yaml 写入 {shard_dir}，只改写内容有变化的文件')
+    parser.add_argument('--shard-dir', default=shard_dir, help=f'分片词库的目录（默认 {shard_dir}）')
+    parser.add_argument('--build-char-table', action='store_true',
+                        help=f'维护用：由 pypinyin 重新生成单音字拼音表 {char_table_file} 后退出')
+    subparsers = parser.add_subparsers(dest='command', metavar='命令')
+    serve_parser = subparsers.add_parser('serve', help='常驻服务：通过本机的 HTTP/JSON 接口逐批分配编码',
+                                         description='常驻服务：编码表、形码表和已有词库只加载一次，'
+                                                     '通过 POST /allocate 逐批分配编码，分配状态在各批之间保留')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认 127.0.0.1）')
+    serve_parser.add_argument('--port', type=int, default=8765, help='监听端口（默认 8765）')
+    serve_parser.add_argument('--state', default=serve_state_file,
+                              help=f'编码分配状态文件（默认 {serve_state_file}），每批分配后保存')
+    serve_parser.add_argument('--no-cache', action='store_true', help=f'不使用注音缓存 {pinyin_cache_file}')
+    serve_parser.add_argument('--low-memory', action='store_true', help='低内存模式')
+    serve_parser.add_argument('--verbose', action='store_true', help='输出每个请求的日志')
+    query_parser = subparsers.add_parser('query', help='按编码、编码前缀或字词查询 result.dict.yaml 和已有词库，统计重码',
+                                         description='按编码、编码前缀或字词查询 result.dict.yaml 和目录下所有 .dict.yaml；'
+                                                     '不指定查询时输出码长 3-6 的重码统计。索引缓存在 '
+                                                     f'{index_dir}/query.idx，词库变化时自动重建')
+    query_parser.add_argument('-c', '--code', action='append', default=[], help='查询编码完全相同的词条，可重复指定')
+    query_parser.add_argument('-p', '--prefix', action='append', default=[], help='查询以此开头的编码，可重复指定')
+    query_parser.add_argument('-w', '--word', action='append', default=[], help='查询字词，可重复指定')
+    query_parser.add_argument('--stats', action='store_true', help='同时输出重码统计')
+    query_parser.add_argument('--limit', type=int, default=50, help='前缀查询最多显示的条数（默认 50）')
+    query_parser.add_argument('--rebuild', action='store_true', help='强制重建索引')
+    audit_parser = subparsers.add_parser('audit', help='按当前的取码规则和形码表重新编码已有词库，找出编码不符的词条',
+                                         description='逐个读取 .dict.yaml 中 ... 之后的词条（跳过 #region 简 等），'
+                                                     '用进程池重新编码，报告编码不是重新算出的全码前缀的词条、缺少形码的字和各词库的处理速度')
+    audit_parser.add_argument('files', nargs='*', help='要校验的词库（默认目录下所有已有的 .dict.yaml，不含转换结果）')
+    audit_parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, metavar='N',
+                              help='用 N 个进程并行编码（默认为 CPU 核数）')
+    audit_parser.add_argument('--engine', choices=['python', 'numpy'], default='python', help='编码引擎（默认 python）')
+    audit_parser.add_argument('--no-cache', action='store_true', help=f'不使用注音缓存 {pinyin_cache_file}')
+    audit_parser.add_argument('--limit', type=int, default=20, help='每个词库最多显示的不符词条数（默认 20）')
+    audit_parser.add_argument('-o', '--output', help='把全部不符的词条写入此文件（制表符分隔）')
+    args = parser.parse_args()
+    if args.checkpoint_every < 0:
+        parser.error('--checkpoint-every 不能小于 0')
+    selecting = args.top is not None or args.min_weight is not None
+    if args.top is not None and args.top < 1:
+        parser.error('--top 必须大于 0')
+    if selecting and (args.incremental or args.resume):
+        parser.error('--top、--min-weight 需要读完全部输入后再选词，不能与 --incremental、--resume 同时使用')
+
+    if args.command == 'query':
+        from jd_query import query
+        query(args.code, args.prefix, args.word, args.stats, args.limit, args.rebuild)
+        return
+
+    if args.command == 'audit':
+        from jd_audit import audit
+        if args.engine == 'numpy' and importlib.util.find_spec('numpy') is None:
+            print('提示：未安装 numpy，使用 Python 引擎')
+            args.engine = 'python'
+        audit(args.files, args.jobs, not args.no_cache, args.engine, args.limit, args.output)
+        return
+
+    if args.command == 'serve':
+        from jd_server import serve
+        serve(args.host, args.port, args.state, not args.no_cache, args.low_memory, args.verbose)
+        return
+
+    if args.build_char_table:
+        print(f'已生成 {char_table_file}，共 {build_char_table()} 个单音字')
+        return
+
+    dump_intermediates = args.dump_intermediates
+    if args.profile and args.report is None:
+        args.report = 'report.json'
+    report = RunReport(args.profile) if args.report else None
+    phase = report.phase if report is not None else lambda name, profile=False: contextlib.nullcontext()
+    counters = report.counters if report is not None else collections.Counter()
+
+    print('正在处理，请稍等……（参考： 平均1万词大约10秒时间，转化完成后，窗口会自动关闭）')
+
+    # 续上中断的转换，或增量转换时读取上次的状态；已有词库等输入有变化时自动改为全量转换
+    with phase('fingerprint'):
+        fingerprint = sources_fingerprint()
+        checkpoint = load_checkpoint(fingerprint) if args.resume else None
+        state = load_state(fingerprint) if args.incremental and checkpoint is None else None
+    if args.resume:
+        print(f"从断点继续转换（All.txt 已处理 {checkpoint['offset']} 字节）" if checkpoint is not None
+              else '没有可用的断点，从头转换')
+    if args.incremental and checkpoint is None:
+        print('增量转换：从上次的位置继续' if state is not None else '增量转换：没有可用的状态，全量转换')
+
+    # 删除上次运行留下的文件；上次的结果保留到本次转换完成时才替换
+    for file in file_list:
+        if os.path.exists(file):
+            os.remove(file)
+    if checkpoint is None and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+    if dump_intermediates and args.jobs > 1:
+        print('提示：--dump-intermediates 时只用单进程转换')
+        args.jobs = 1
+    if args.engine == 'numpy':
+        if dump_intermediates:
+            print('提示：--dump-intermediates 时只用 Python 引擎')
+            args.engine = 'python'
+        elif importlib.util.find_spec('numpy') is None:
+            print('提示：未安装 numpy，使用 Python 引擎')
+            args.engine = 'python'
+
+    # 1. 获取已有的编码和字词
+    with phase('dict_scan'):
+        bm_set, zc_set = load_existing(dump_intermediates)
+    set_factory = HashSet if args.low_memory else set
+    if checkpoint is not None:
+        # 临时结果文件截掉断点之后写入的部分，接着写
+        state = checkpoint
+        os.truncate(output_tmp_file, state.pop('output_size'))
+        counters.update(state.pop('counters'))
+        allocator_stats = state.pop('allocator')
+    elif state is not None:
+        # 增量转换：在上次结果的副本后面追加
+        shutil.copyfile(output_file, output_tmp_file)
+        allocator_stats = None
+    else:
+        state = new_state(fingerprint, set_factory)
+        with open(output_tmp_file, 'w', encoding='utf-8') as outfile:
+            outfile.write(content)
+        allocator_stats = None
+    start, end = state['offset'], os.path.getsize('./All.txt')
+    # 中间文件按整个转换写一次，不分段；按权重选词时读完全部输入才开始编码，也不分段
+    checkpoint_size = 0 if dump_intermediates or selecting else int(args.checkpoint_every * (1 << 20))
+
+    # 2. 各阶段串成流水线，逐条处理；逐词编码的部分可以多进程并行
+    cache = None
+    with phase('load_tables'):
+        if args.jobs > 1:
+            dictx = load_shape_codes()
+        else:
+            cache = None if args.no_cache else PinyinCache()
+            tables = load_tables()
+            dictx = tables[3]
+            encode_words = load_engine(args.engine)
+    # 形码只在音码被占用、需要顺延到 5、6 码时才查
+    allocator = CodeAllocator(bm_set, zc_set, state['entries'], state['taken'], set_factory, dictx)
+    if allocator_stats is not None:
+        for name, value in allocator_stats.items():
+            setattr(allocator, name, value)
+
+    def pipeline(words, prefiltered=False):
+        # 已有词库中已有的词组和重复的词组在注音之前就去掉
+        if not prefiltered:
+            words = timed(allocator.prefilter(words, state['seen_words'], counters), 'prefilter', report)
+        if args.jobs > 1:
+            records = parallel_encode_words(words, pool, args.jobs, counters=counters)
+            records = timed(records, 'encode_parallel', report)
+        else:
+            records = encode_words(words, tables, cache, dump_intermediates, counters, report)
+        records = dump(records, 'jdAll.csv', lambda r: f"{r[0]}\t{r[1]}\n", dump_intermediates, 'UTF-8-sig')
+        records = dump(records, 'jdAllx.csv', lambda r: f"{r[0]}\t{full_code(r[0], r[1], dictx) or ''}\n", dump_intermediates)
+        return timed(allocator.allocate_all(records), 'allocation', report)
+
+    # 规整后的词组 → 权重，写入词条的第三列；只记录当前一段（或选出的词组）
+    weights = {}
+
+    def selected_words():
+        # 先去掉已有和重复的词组再选，选出的都是要输出的词组
+        entries = timed(read_entries(start=start, end=end, counters=counters), 'read', report)
+        entries = timed(allocator.prefilter(entries, state['seen_words'], counters, weighted=True), 'prefilter', report)
+        entries = timed(select_words(entries, args.top, args.min_weight, counters), 'select', report)
+        return entry_words(entries, weights)
+
+    # 3. 分段分配编码并写入临时结果文件，保持 All.txt 的原始顺序（按权重选词时为权重顺序）；每段之后写一次断点
+    # 多进程编码时进程池只创建一次，各段共用
+    pool = encode_pool(args.jobs, not args.no_cache, args.engine) if args.jobs > 1 else contextlib.nullcontext()
+    with phase('pipeline', profile=True), pool, open(output_tmp_file, 'a', encoding='utf-8') as outfile:
+        for segment_start, segment_end in segment_bounds('./All.txt', start, end, checkpoint_size):
+            weights.clear()
+            if selecting:
+                lines = pipeline(selected_words(), prefiltered=True)
+            else:
+                words = read_words(start=segment_start, end=segment_end, counters=counters, weights=weights)
+                lines = pipeline(timed(words, 'read', report))
+            for word, code in lines:
+                weight = weights.get(word) if weights else None
+                outfile.write(f"{word}\t{code}\n" if weight is None else f"{word}\t{code}\t{weight}\n")
+            state['offset'] = segment_end
+            if segment_end < end:
+                with phase('checkpoint'):
+                    save_checkpoint(state, outfile, counters, allocator)
+
+    # 先保存与新结果对应的状态，再替换结果；两步之间中断时状态与结果大小不符，下次自动全量转换
+    with phase('save_state'):
+        if args.incremental:
+            state['digest'] = file_digest('./All.txt', end)
+            state['output_size'] = os.path.getsize(output_tmp_file)
+            save_state(state)
+        elif os.path.exists(state_file):
+            os.remove(state_file)
+        os.replace(output_tmp_file, output_file)
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+
+    if cache is not None:
+        cache.close()
+
+    if args.shard:
+        with phase('shards'):
+            changed = write_shards(args.shard, directory=args.shard_dir)
+        print(f'分片词库已写入 {args.shard_dir}，其中 {len(changed)} 个文件有变化')
+
+    print(allocator.summary())
+    if allocator.missing_shape:
+        chars = ''.join(ch for ch, _ in allocator.missing_chars.most_common(20))
+        print(f"音码被占用、缺少形码而跳过的词条 {allocator.missing_shape} 条（jdx.csv 中没有的字：{chars}）")
+    if report is not None:
+        report.write(args.report, allocator, jobs=args.jobs, incremental=args.incremental, low_memory=args.low_memory)
+        print(f'运行报告已写入 {args.report}')
@@ -0,0 +1,143 @@
+"""
+可选的 NumPy 批量编码引擎（--engine numpy），需要安装 numpy
+
+把一批词组转成码位数组，用以码位为下标的 NumPy 表查出每个字的读音序号和双拼，
+再按 process_row_to_code 的取码规则（二字词 2+2、三字词 1+1+1、四字及以上取前三字和末字）
+整列拼出音码。只有全由单音字组成的词组走这条路；含多音字、表外字的词组
+仍逐个交给 encode_words，结果（包括顺序和各项计数）与 encode_words 完全相同。
+"""
+
+import numpy as np
+
+from jd_converter import chunked, encode_syllables, encode_words as encode_words_python, fj_shengmu, fj_yunmu_1, fj_yunmu_2, timed
+
+batch_size = 65536  # 每批向量化处理的词数
+
+# 由 load_tables() 的结果生成的 NumPy 表，id(tables) → (tables, NumpyTables)，进程池中每批都会用到
+_numpy_tables = {}
+
+
+class NumpyTables:
+    """以码位偏移（码位 - base）为下标的各种表"""
+
+    def __init__(self, tables):
+        (base, index, syllables), table_1, table_2, _ = tables
+        self.base = base
+        self.size = len(index)
+
+        # 读音序号 → 两种变体的双拼（各取前两个字母）、是否飞键
+        n = len(syllables)
+        self.letters_1 = np.zeros((n, 2), np.uint8)
+        self.letters_2 = np.zeros((n, 2), np.uint8)
+        self.fj = np.zeros(n, np.bool_)
+        usable = np.zeros(n, np.bool_)
+        for number, key in enumerate(syllables[1:], 1):
+            jd_1 = encode_syllables([key], table_1, fj_yunmu_1)[0]
+            jd_2 = encode_syllables([key], table_2, fj_yunmu_2)[0]
+            # 规则推算出的非常规双拼（未知韵母等）留给逐词的流程
+            if len(jd_1) >= 2 and len(jd_2) >= 2 and (jd_1 + jd_2).isascii():
+                self.letters_1[number] = list(jd_1[:2].encode('ascii'))
+                self.letters_2[number] = list(jd_2[:2].encode('ascii'))
+                usable[number] = True
+            self.fj[number] = key[0] in fj_shengmu and key[1] in fj_yunmu_1
+
+        # 码位偏移 → 读音序号，0 表示这个字要走逐词的流程
+        self.numbers = np.frombuffer(index, np.uint16).copy()
+        self.numbers[~usable[self.numbers]] = 0
+
+
+def numpy_tables(tables):
+    entry = _numpy_tables.get(id(tables))
+    if entry is None or entry[0] is not tables:
+        entry = _numpy_tables[id(tables)] = (tables, NumpyTables(tables))
+    return entry[1]
+
+
+def assemble(letters, numbers, lengths):
+    """按取码规则拼出每个词的音码（三字词 3 位，第 4 位为 0），返回 (n, 4) 的字母矩阵"""
+    number_0, number_1, number_2, number_last = numbers
+    first_0 = letters[number_0, 0]
+    first_1 = letters[number_1, 0]
+    two = lengths == 2
+    codes = np.empty((len(lengths), 4), np.uint8)
+    codes[:, 0] = first_0
+    codes[:, 1] = np.where(two, letters[number_0, 1], first_1)
+    codes[:, 2] = np.where(two, first_1, letters[number_2, 0])
+    codes[:, 3] = np.where(two, letters[number_1, 1], np.where(lengths == 3, 0, letters[number_last, 0]))
+    return codes
+
+
+def to_records(words, codes):
+    """(n, 4) 的字母矩阵 → [(词组, 音码), ...]"""
+    # 转为 UCS-4 后整行视为一个定长字符串，tolist() 时末尾的 0 自动去掉
+    return list(zip(words, codes.astype(np.uint32).view('<U4').ravel().tolist()))
+
+
+def encode_batch(words, tables, cache=None, counters=None):
+    """编码一批词组，按输入顺序返回 (词组, 音码) 的列表"""
+    t = numpy_tables(tables)
+    lengths = np.fromiter(map(len, words), np.int64, len(words))
+    starts = np.cumsum(lengths) - lengths
+    points = np.frombuffer(''.join(words).encode('utf-32-le', 'surrogatepass'), np.uint32).astype(np.int64) - t.base
+    inside = (points >= 0) & (points < t.size)
+    offsets = np.where(inside, points, 0)
+    numbers = np.where(inside, t.numbers[offsets], 0)
+
+    # 每个词中走不了向量化的字数、飞键字数
+    bad = np.concatenate(([0], np.cumsum(numbers == 0)))
+    fj = np.concatenate(([0], np.cumsum(t.fj[numbers])))
+    ends = starts + lengths
+    vectorized = (lengths > 0) & (bad[ends] == bad[starts])
+    # 只有二字词需要飞键的第二种编码，同 split_flying_keys
+    is_fj = (fj[ends] > fj[starts]) & (lengths == 2)
+    if counters is not None:
+        counters['flying_key_words'] += int(np.count_nonzero(vectorized & is_fj))
+
+    # 一字词没有音码，不产出记录
+    selected = np.flatnonzero(vectorized & (lengths >= 2))
+    n = lengths[selected]
+    p = starts[selected]
+    last = p + n - 1
+    positions = (p, p + 1, np.minimum(p + 2, last), last)
+    word_numbers = [numbers[pos] for pos in positions]
+
+    codes_1 = assemble(t.letters_1, word_numbers, n)
+    # 飞键的第二种编码只对含飞键的二字词计算
+    candidates = np.flatnonzero(is_fj[selected])
+    codes_2 = assemble(t.letters_2, [column[candidates] for column in word_numbers], n[candidates])
+    differ = (codes_1[candidates] != codes_2).any(axis=1)
+    variant = candidates[differ]
+    codes_2 = codes_2[differ]
+    if counters is not None:
+        counters['flying_key_variants'] += len(variant)
+
+    selected_words = [words[i] for i in selected.tolist()]
+    records_1 = to_records(selected_words, codes_1)
+    records_2 = to_records([selected_words[j] for j in variant.tolist()], codes_2)
+
+    # 按输入顺序插入飞键编码和逐词处理的词组，其余的向量化结果整段复制
+    scalar = np.flatnonzero(~vectorized)
+    specials = sorted([(i, None) for i in scalar.tolist()] +
+                      [(i, record) for i, record in zip(selected[variant].tolist(), records_2)])
+    # 每个特殊词组之前（含本身）有几个向量化的词组
+    before = np.searchsorted(selected, [i for i, _ in specials], side='right').tolist()
+    records = []
+    done = 0
+    for (i, record), k in zip(specials, before):
+        records.extend(records_1[done:k])
+        done = k
+        if record is None:
+            records.extend(encode_words_python((words[i],), tables, cache, counters=counters))
+        else:
+            records.append(record)
+    records.extend(records_1[done:])
+    return records
+
+
+def encode_words(words, tables, cache=None, dump_intermediates=False, counters=None, report=None):
+    """与 jd_converter.encode_words 相同，按批向量化编码；不支持 --dump-intermediates"""
+    def records():
+        for batch in chunked(words, batch_size):
+            yield from encode_batch(batch, tables, cache, counters)
+
+    return timed(records(), 'encode_numpy', report)
@@ -0,0 +1,240 @@
+"""
+query 模式：按编码、编码前缀或字词查询 result.dict.yaml 和目录下所有 .dict.yaml，并统计各码长的重码
+
+由 python jd-dict-converter.py query 启动。所有词库的 (编码, 字词) 按编码、按字词各排一份序，
+写入 .dict_index/query.idx，通过 mmap 直接二分查找；任一词库的大小或修改时间变化时自动重建。
+"""
+
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from jd_converter import existing_dicts, index_dir, output_file, scan_dict
+
+query_index_file = os.path.join(index_dir, 'query.idx')
+query_magic = b'JDQX'
+query_version = 1
+collision_lengths = range(3, 7)  # 统计重码的码长
+# 标识、版本、词库指纹、条数、词库名区长度，然后是码长 3-6 各自的 (编码数, 重码的编码数)
+query_header = struct.Struct('<4sI16sQI8I')
+
+
+def query_dicts():
+    """参与查询的词库：result.dict.yaml（存在时）和目录下其它 .dict.yaml"""
+    files = existing_dicts()
+    if os.path.exists(output_file):
+        files.insert(0, output_file)
+    return files
+
+
+def dicts_fingerprint(files):
+    """各词库的文件名、大小和修改时间的摘要"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(query_version).encode())
+    for filename in files:
+        st = os.stat(filename)
+        h.update(f'{os.path.basename(filename)}\t{st.st_size}\t{st.st_mtime_ns}\n'.encode('utf-8'))
+    return h.digest()
+
+
+def padding(pos):
+    """补齐到 8 字节边界需要的字节数"""
+    return -pos % 8
+
+
+def write_column(f, lines):
+    """写入一列排序后的行：行偏移数组（n + 1 个）和以 UTF-8 编码的各行"""
+    blobs = [line.encode('utf-8') for line in lines]
+    offsets = array('Q', [0])
+    total = 0
+    for blob in blobs:
+        total += len(blob)
+        offsets.append(total)
+    offsets.tofile(f)
+    f.write(b''.join(blobs))
+    f.write(bytes(padding(total)))
+
+
+def collision_stats(entries):
+    """各码长的编码数和对应多个字词的编码数"""
+    words = {}
+    for code, word, _ in entries:
+        words.setdefault(code, set()).add(word)
+    stats = []
+    for length in collision_lengths:
+        codes = [code for code in words if len(code) == length]
+        stats += [len(codes), sum(1 for code in codes if len(words[code]) > 1)]
+    return stats
+
+
+def build_query_index(files, fingerprint):
+    """解析各词库（跳过 #region 简 等，规则同转换时读取已有词库），写入查询索引"""
+    entries = set()
+    for number, filename in enumerate(files):
+        for word, code in scan_dict(filename):
+            entries.add((code, word, number))
+    # UTF-8 字节序与码位顺序一致，按字符串排序后即可按字节二分
+    by_code = sorted(f'{code}\t{word}\t{number}' for code, word, number in entries)
+    by_word = sorted(f'{word}\t{code}\t{number}' for code, word, number in entries)
+    names = '\n'.join(os.path.basename(filename) for filename in files).encode('utf-8')
+
+    os.makedirs(index_dir, exist_ok=True)
+    tmp = query_index_file + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(query_header.pack(query_magic, query_version, fingerprint, len(entries), len(names),
+                                  *collision_stats(entries)))
+        f.write(names)
+        f.write(bytes(padding(query_header.size + len(names))))
+        write_column(f, by_code)
+        write_column(f, by_word)
+    os.replace(tmp, query_index_file)
+
+
+class Column:
+    """mmap 中一列排序后的行，按下标取出每行的键（第一个字段，bytes），供 bisect 使用"""
+
+    def __init__(self, view, pos, n):
+        self.offsets = view[pos:pos + 8 * (n + 1)].cast('Q')
+        self.start = pos + 8 * (n + 1)
+        self.end = self.start + self.offsets[n]
+        self.view = view
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def line(self, i):
+        return bytes(self.view[self.start + self.offsets[i]:self.start + self.offsets[i + 1]])
+
+    def __getitem__(self, i):
+        line = self.line(i)
+        return line[:line.index(b'\t')]
+
+    def rows(self, lo, hi):
+        """第 lo 到 hi - 1 行，拆成 (键, 值, 词库序号)"""
+        for i in range(lo, hi):
+            key, value, number = self.line(i).decode('utf-8').split('\t')
+            yield key, value, int(number)
+
+    def exact(self, key):
+        key = key.encode('utf-8')
+        return bisect.bisect_left(self, key), bisect.bisect_right(self, key)
+
+    def prefix(self, prefix):
+        prefix = prefix.encode('utf-8')
+        lo = bisect.bisect_left(self, prefix)
+        # 以 prefix 开头的键都小于 prefix + 最大字节
+        return lo, bisect.bisect_left(self, prefix + b'\xff', lo)
+
+
+class QueryIndex:
+    """查询索引：by_code 按编码排序，by_word 按字词排序"""
+
+    def __init__(self, path=query_index_file):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = query_header.unpack_from(self.mm)
+        self.magic, self.version, self.fingerprint, n, names_len = fields[:5]
+        self.stats = {length: fields[5 + 2 * i:7 + 2 * i] for i, length in enumerate(collision_lengths)}
+        self.n = n
+        view = self.view = memoryview(self.mm)
+        pos = query_header.size
+        self.files = bytes(view[pos:pos + names_len]).decode('utf-8').split('\n')
+        pos += names_len
+        pos += padding(pos)
+        self.by_code = Column(view, pos, n)
+        pos = self.by_code.end
+        pos += padding(pos)
+        self.by_word = Column(view, pos, n)
+
+    def code(self, code):
+        """编码完全相同的词条，产出 (编码, 字词, 词库名)"""
+        for key, word, number in self.by_code.rows(*self.by_code.exact(code)):
+            yield key, word, self.files[number]
+
+    def code_prefix(self, prefix, limit=None):
+        """以 prefix 开头的编码的词条（按编码排序），最多 limit 条"""
+        lo, hi = self.by_code.prefix(prefix)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        for key, word, number in self.by_code.rows(lo, hi):
+            yield key, word, self.files[number]
+
+    def word(self, word):
+        """字词完全相同的词条"""
+        for key, code, number in self.by_word.rows(*self.by_word.exact(word)):
+            yield code, key, self.files[number]
+
+    def count_prefix(self, prefix):
+        lo, hi = self.by_code.prefix(prefix)
+        return hi - lo
+
+    def close(self):
+        # 先释放引用 mmap 的各个 memoryview，才能关闭
+        self.by_code.offsets.release()
+        self.by_word.offsets.release()
+        self.by_code = self.by_word = None
+        self.view.release()
+        self.mm.close()
+
+
+def load_query_index(rebuild=False):
+    """读取查询索引，词库有变化或索引损坏时重建"""
+    files = query_dicts()
+    fingerprint = dicts_fingerprint(files)
+    if not rebuild:
+        try:
+            index = QueryIndex()
+        except (OSError, ValueError, struct.error, UnicodeDecodeError):
+            index = None
+        if index is not None:
+            if (index.magic, index.version, index.fingerprint) == (query_magic, query_version, fingerprint):
+                return index
+            # Windows 上仍被映射的文件不能替换，重建之前先关闭
+            index.close()
+    build_query_index(files, fingerprint)
+    return QueryIndex()
+
+
+def print_entries(title, entries, elapsed, total=None):
+    entries = list(entries)
+    print(f'{title}：{total if total is not None else len(entries)} 条（{elapsed * 1000:.3f} ms）')
+    for code, word, filename in entries:
+        print(f'  {word}\t{code}\t{filename}')
+    if total is not None and total > len(entries):
+        print(f'  ……（只显示前 {len(entries)} 条）')
+
+
+def print_stats(index):
+    print(f'词库 {len(index.files)} 个，共 {index.n} 条：' + '、'.join(index.files))
+    print('码长\t编码数\t重码编码数')
+    for length in collision_lengths:
+        codes, collisions = index.stats[length]
+        print(f'{length}\t{codes}\t{collisions}')
+
+
+def query(codes=(), prefixes=(), words=(), stats=False, limit=50, rebuild=False):
+    """query 命令：逐个查询编码、编码前缀和字词；什么都不查时输出重码统计"""
+    start = time.perf_counter()
+    index = load_query_index(rebuild)
+    print(f'索引就绪（{(time.perf_counter() - start) * 1000:.1f} ms）')
+
+    for code in codes:
+        start = time.perf_counter()
+        entries = list(index.code(code))
+        print_entries(f'编码 {code}', entries, time.perf_counter() - start)
+    for prefix in prefixes:
+        start = time.perf_counter()
+        entries = list(index.code_prefix(prefix, limit))
+        total = index.count_prefix(prefix)
+        print_entries(f'编码前缀 {prefix}', entries, time.perf_counter() - start, total)
+    for word in words:
+        start = time.perf_counter()
+        entries = list(index.word(word))
+        print_entries(f'字词 {word}', entries, time.perf_counter() - start)
+    if stats or not (codes or prefixes or words):
+        print_stats(index)
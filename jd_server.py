@@ -0,0 +1,190 @@
+"""
+serve 模式：编码表、形码表和已有词库只加载一次，通过本机的 HTTP/JSON 接口逐批分配编码
+
+由 python jd-dict-converter.py serve 启动；单独成一个模块，普通转换时不必导入 http.server。
+"""
+
+import hashlib
+import http.server
+import json
+import os
+import signal
+import time
+
+from jd_converter import (HashSet, JDConverter, new_state, read_state, save_state, serve_state_file,
+                          sources_fingerprint, word_pinyin)
+
+# 分配状态：快照加上快照之后各批词组的日志（快照文件名加 .log），重启服务后先重放日志
+snapshot_every = 100000  # 日志中累计多少个词后写一次快照
+
+
+def journal_header(fingerprint):
+    """日志的第一行：输入源的指纹，与当前不符的日志不重放"""
+    return json.dumps({'fingerprint': hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()}) + '\n'
+
+
+def replay_journal(converter, path, fingerprint):
+    """重放日志中的各批词组，返回词数，日志不存在或属于其它输入源时返回 None；快照写入后日志未及清空时重放也不会改变分配结果"""
+    if not os.path.exists(path):
+        return None
+    count = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        # 已有词库等有变化而快照作废时，日志中的词组也没有分配过新状态下的编码
+        if f.readline() != journal_header(fingerprint):
+            return None
+        for line in f:
+            try:
+                words = json.loads(line)
+            except ValueError:
+                # 最后一行可能没写完，该批的响应也没有发出
+                break
+            converter.allocate_batch(words)
+            count += len(words)
+    return count
+
+
+class ConvertServer(http.server.HTTPServer):
+    """serve 模式的服务器，逐个处理请求，持有转换器和分配状态的日志"""
+
+    requests = 0
+    words = 0
+
+    def log_batch(self, words):
+        """把分配过编码的一批词组写入日志，日志过长时写快照"""
+        self.journal.write(json.dumps(words, ensure_ascii=False) + '\n')
+        self.journal.flush()
+        self.journal_words += len(words)
+        if self.journal_words >= snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        """保存分配状态的快照并清空日志"""
+        save_state(self.converter.state, self.state_path)
+        self.start_journal()
+
+    def start_journal(self):
+        """清空日志，只留下指纹行"""
+        self.journal.seek(0)
+        self.journal.truncate()
+        self.journal.write(journal_header(self.converter.state['fingerprint']))
+        self.journal.flush()
+        self.journal_words = 0
+
+
+class ConvertHandler(http.server.BaseHTTPRequestHandler):
+    """serve 模式的 HTTP/JSON 接口
+
+    POST /allocate  {"words": [...]} → {"results": [{"word": 词组, "codes": [编码, ...]}, ...]}，按输入顺序
+    POST /encode    {"words": [...]} → {"results": [{"word": 词组, "codes": [[音码, 音形码], ...]}, ...]}，不分配编码
+    GET  /stats     → 已处理的请求数、词数和分配统计
+    """
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        """读取请求中的词组列表，格式不对或词组中含制表符、换行时返回 None"""
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            words = body['words']
+        except (ValueError, KeyError, TypeError):
+            return None
+        if not isinstance(words, list) or not all(isinstance(word, str) for word in words):
+            return None
+        # 词条以"词组\t编码"一行保存，词组中不能有制表符和换行
+        if any('\t' in word or '\n' in word or '\r' in word for word in words):
+            return None
+        return words
+
+    def do_POST(self):
+        server = self.server
+        if self.path not in ('/allocate', '/encode'):
+            self.send_json(404, {'error': f'未知的路径 {self.path}'})
+            return
+        words = self.read_body()
+        if words is None:
+            self.send_json(400, {'error': '请求体应为 {"words": ["词组", ...]}，词组中不能有制表符和换行'})
+            return
+
+        start = time.perf_counter()
+        converter = server.converter
+        if self.path == '/encode':
+            results = [{'word': word, 'codes': [[code, full_code] for _, code, full_code in converter.encode(word)]}
+                       for word in words]
+        else:
+            results = [{'word': word, 'codes': codes} for word, codes in zip(words, converter.allocate_batch(words))]
+            if any(result['codes'] for result in results):
+                server.log_batch(words)
+        server.requests += 1
+        server.words += len(words)
+        self.send_json(200, {'results': results, 'seconds': round(time.perf_counter() - start, 6)})
+
+    def do_GET(self):
+        if self.path != '/stats':
+            self.send_json(404, {'error': f'未知的路径 {self.path}'})
+            return
+        server, allocator = self.server, self.server.converter.allocator
+        self.send_json(200, {
+            'requests': server.requests,
+            'words': server.words,
+            'entries': sum(allocator.allocated.values()) + allocator.overflow,
+            'allocated': allocator.allocated,
+            'collisions': allocator.collisions,
+            'overflow': allocator.overflow,
+            'excluded_existing': allocator.excluded,
+            'counters': dict(server.converter.counters),
+        })
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(host='127.0.0.1', port=8765, state_path=serve_state_file, use_cache=True, low_memory=False, verbose=False):
+    """常驻服务：编码表、形码表和已有词库只加载一次，逐批分配编码，分配状态在各批之间保留并保存到 state_path"""
+    # 已有词库、编码表等有变化时，之前的分配状态作废
+    fingerprint = sources_fingerprint()
+    state = read_state(state_path, fingerprint)
+    if state is None:
+        state = new_state(fingerprint, HashSet if low_memory else set)
+        print('没有可用的分配状态，从头开始分配')
+    converter = JDConverter(use_cache, low_memory, state=state)
+    # 先加载 pypinyin 的数据，第一个请求不必等待
+    word_pinyin('键道')
+
+    journal_path = state_path + '.log'
+    replayed = replay_journal(converter, journal_path, fingerprint)
+    if replayed:
+        print(f'已重放日志中的 {replayed} 个词')
+
+    server = ConvertServer((host, port), ConvertHandler)
+    server.converter = converter
+    server.state_path = state_path
+    server.journal = open(journal_path, 'a', encoding='utf-8')
+    if replayed is None:
+        # 没有日志或日志属于其它输入源
+        server.start_journal()
+    else:
+        server.journal_words = replayed
+    server.verbose = verbose
+    print(f'服务已启动：http://{host}:{server.server_address[1]}/allocate（按 Ctrl+C 退出）')
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # 被 kill 时同样写快照后退出
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.snapshot()
+        server.journal.close()
+        server.server_close()
+        converter.close()
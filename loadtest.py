@@ -0,0 +1,66 @@
+"""
+serve 模式的压测客户端：用与 benchmark.py 相同的合成词组，向 /allocate 连续发送批量请求，统计吞吐量和延迟
+
+用法：
+    python jd-dict-converter.py serve                         # 先启动服务
+    python loadtest.py --requests 200 --batch 50              # 200 个请求，每批 50 个词
+    python loadtest.py --concurrency 4                        # 4 个客户端同时发送
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark import corpus_chars, generate_words
+
+
+def post(url, words):
+    """发送一批词组，返回 (延迟秒数, 响应)"""
+    data = json.dumps({'words': words}, ensure_ascii=False).encode('utf-8')
+    request = urllib.request.Request(url, data, {'Content-Type': 'application/json; charset=utf-8'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        body = json.loads(response.read())
+    return time.perf_counter() - start, body
+
+
+def percentile(values, p):
+    """已排序列表的 p 分位数"""
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='jd-dict-converter.py serve 的压测客户端')
+    parser.add_argument('--url', default='http://127.0.0.1:8765/allocate', help='服务地址（默认 http://127.0.0.1:8765/allocate）')
+    parser.add_argument('--requests', type=int, default=200, help='请求数（默认 200）')
+    parser.add_argument('--batch', type=int, default=50, help='每个请求的词数（默认 50）')
+    parser.add_argument('--concurrency', type=int, default=1, help='同时发送请求的客户端数（默认 1）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子（默认 1）')
+    parser.add_argument('--fj-share', type=float, default=0.05, help='含飞键字的词组比例（默认 0.05）')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    plain, fj_chars = corpus_chars()
+    words = list(generate_words(args.requests * args.batch, rng, plain, fj_chars, args.fj_share))
+    batches = [words[i:i + args.batch] for i in range(0, len(words), args.batch)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        responses = list(pool.map(lambda batch: post(args.url, batch), batches))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in responses)
+    codes = sum(len(result['codes']) for _, body in responses for result in body['results'])
+    print(f'{len(batches)} 个请求，{len(words)} 个词，分配 {codes} 条编码，用时 {elapsed:.3f}s')
+    print(f'吞吐量：{len(batches) / elapsed:.1f} 请求/秒，{len(words) / elapsed:.0f} 词/秒')
+    print('延迟：' + '，'.join(f'{name} {percentile(latencies, p) * 1000:.1f}ms'
+                              for name, p in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('最大', 1.0))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,27 +1,49 @@
 """
 result.dict.yaml 排序脚本
 支持多种排序方式：按编码排序、按词组长度排序、按拼音排序等
+
+不带参数运行时为交互模式；带 --key 参数时直接排序、不提示，可用于批处理：
+    python sort_result.py --key code-length --key code
+词条多于 --run-entries 条时分段排序后写入临时文件，再用 heapq.merge 归并，内存占用有上限。
 """
 
+import argparse
+import heapq
 import os
+import pickle
+import shutil
 import sys
+import tempfile
+from operator import itemgetter
 
-def read_yaml_content(file_path):
-    """读取 YAML 文件，分离头部和词条（支持有头部和无头部两种情况）"""
-    if not os.path.exists(file_path):
-        print(f"错误：文件 {file_path} 不存在！")
-        sys.exit(1)
+default_file = './result.dict.yaml'
+run_entries = 200000  # 每段在内存中排序的词条数，超过后写入临时文件
+merge_fan_in = 64     # 一次归并最多同时打开的临时文件数
+pickle_batch = 1024   # 临时文件中每次 pickle 的词条数
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+sort_keys = ['code', 'word-length', 'code-length', 'pinyin', 'entry']
 
-    # 分离 YAML 头部和词条内容
-    header = []
-    entries = []
+# 交互模式的选项 → 排序键；2、3 与以前一样，最后按整行内容排
+menu_keys = {
+    '1': ['code'],
+    '2': ['word-length', 'entry'],
+    '3': ['code-length', 'code', 'entry'],
+    '4': ['pinyin'],
+}
+
+
+def split_entry(entry):
+    """词条行 → (词组, 编码)"""
+    parts = entry.split('\t')
+    return parts[0], parts[1] if len(parts) > 1 else ''
+
+
+def scan_yaml(f, header):
+    """逐行读取 YAML 文件，头部行追加到 header 中，产出词条（支持有头部和无头部两种情况）"""
     in_header = False
     has_header = False
 
-    for line in lines:
+    for line in f:
         stripped = line.strip()
         # YAML 头部以 --- 开始，以 ... 结束
         if stripped == '---':
@@ -34,82 +56,238 @@ def read_yaml_content(file_path):
         elif in_header:
             header.append(line)
         elif '\t' in line:  # 词条行（包含制表符）
-            entries.append(line.strip())
+            yield stripped
+
+
+def read_yaml_content(file_path):
+    """读取 YAML 文件，分离头部和词条"""
+    if not os.path.exists(file_path):
+        print(f"错误：文件 {file_path} 不存在！")
+        sys.exit(1)
 
+    header = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        entries = list(scan_yaml(f, header))
     return header, entries
 
+
+class PinyinKey:
+    """词组 → 拼音排序键 (不带声调的拼音, 词组)：单音字查表，其余查注音缓存或用 pypinyin"""
+
+    def __init__(self, use_cache=True):
+        # 只有按拼音排序时才加载注音相关的表和 pypinyin
+        from jd_converter import PinyinCache, load_char_table, table_pinyin, word_pinyin
+        self.char_table = load_char_table()
+        self.table_pinyin = table_pinyin
+        self.cache = PinyinCache() if use_cache else None
+        self.lookup = self.cache.get if self.cache is not None else word_pinyin
+
+    def __call__(self, word):
+        syllables = self.table_pinyin(word, self.char_table)
+        if syllables is None:
+            syllables = self.lookup(word)
+        # 音节之间用空格分隔，逐个音节比较（空格排在字母之前）；同音词再按词组本身排序
+        return ' '.join(s + u for s, u in syllables), word
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+
+def make_sort_key(keys, pinyin_key=None):
+    """由排序键列表生成词条 → 排序键元组的函数，前面的键优先"""
+    getters = {
+        'code': lambda word, code, entry: code,
+        'word-length': lambda word, code, entry: len(word),
+        'code-length': lambda word, code, entry: len(code),
+        'pinyin': lambda word, code, entry: pinyin_key(word),
+        'entry': lambda word, code, entry: entry,
+    }
+    funcs = [getters[k] for k in keys]
+
+    def sort_key(entry):
+        word, code = split_entry(entry)
+        return tuple(func(word, code, entry) for func in funcs)
+
+    return sort_key
+
+
+def write_run(items, tmp_dir):
+    """把已排序的 (排序键, 词条) 写入临时文件，返回文件路径"""
+    fd, path = tempfile.mkstemp(prefix='sort_', suffix='.run', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as f:
+        for i in range(0, len(items), pickle_batch):
+            pickle.dump(items[i:i + pickle_batch], f, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def read_run(path):
+    """逐条读出临时文件中的 (排序键, 词条)"""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def merge_group(group, tmp_dir):
+    """把几个临时文件归并成一个，返回新文件路径"""
+    fd, path = tempfile.mkstemp(prefix='sort_', suffix='.run', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as f:
+        batch = []
+        for item in heapq.merge(*map(read_run, group), key=itemgetter(0)):
+            batch.append(item)
+            if len(batch) >= pickle_batch:
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                batch = []
+        if batch:
+            pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+    for p in group:
+        os.remove(p)
+    return path
+
+
+def merge_runs(paths, tmp_dir):
+    """临时文件太多时逐轮分组归并，直到一次能全部打开；返回各段的迭代器"""
+    while len(paths) > merge_fan_in:
+        # 相邻的段合并，各段仍保持输入中的先后顺序，归并才是稳定的
+        paths = [merge_group(paths[i:i + merge_fan_in], tmp_dir) for i in range(0, len(paths), merge_fan_in)]
+    return [read_run(p) for p in paths]
+
+
+def external_sort(entries, sort_key, tmp_dir, max_entries=run_entries):
+    """稳定排序：每条只计算一次排序键，超过 max_entries 条时分段写入 tmp_dir；读完全部输入后返回排序后词条的迭代器"""
+    runs = []
+    buffer = []
+    for entry in entries:
+        buffer.append((sort_key(entry), entry))
+        if len(buffer) >= max_entries:
+            buffer.sort(key=itemgetter(0))
+            runs.append(write_run(buffer, tmp_dir))
+            buffer = []
+    buffer.sort(key=itemgetter(0))
+
+    if not runs:
+        return map(itemgetter(1), buffer)
+    if buffer:
+        runs.append(write_run(buffer, tmp_dir))
+    # heapq.merge 在键相同时按参数顺序取，先写入的段在前，保证稳定
+    return map(itemgetter(1), heapq.merge(*merge_runs(runs, tmp_dir), key=itemgetter(0)))
+
+
+def sort_entries(entries, keys, use_cache=True):
+    """在内存中按排序键列表排序"""
+    pinyin_key = PinyinKey(use_cache) if 'pinyin' in keys else None
+    try:
+        sort_key = make_sort_key(keys, pinyin_key)
+        return sorted(entries, key=sort_key)
+    finally:
+        if pinyin_key is not None:
+            pinyin_key.close()
+
+
 def sort_by_code(entries):
     """按编码排序（字母顺序）"""
-    def get_code(entry):
-        parts = entry.split('\t')
-        return parts[1] if len(parts) > 1 else ''
+    return sort_entries(entries, ['code'])
 
-    return sorted(entries, key=get_code)
 
 def sort_by_word_length(entries):
-    """按词组长度排序（从短到长）"""
-    def get_word_length(entry):
-        parts = entry.split('\t')
-        word = parts[0] if len(parts) > 0 else ''
-        return (len(word), entry)  # 先按长度，再按原始内容
+    """按词组长度排序（从短到长，同长度按原始内容）"""
+    return sort_entries(entries, ['word-length', 'entry'])
 
-    return sorted(entries, key=get_word_length)
 
 def sort_by_code_length(entries):
-    """按编码长度排序（从短到长）"""
-    def get_code_length(entry):
-        parts = entry.split('\t')
-        code = parts[1] if len(parts) > 1 else ''
-        return (len(code), code, entry)  # 先按编码长度，再按编码字母，最后按原始内容
+    """按编码长度排序（从短到长，同长度按编码字母，最后按原始内容）"""
+    return sort_entries(entries, ['code-length', 'code', 'entry'])
 
-    return sorted(entries, key=get_code_length)
 
 def sort_by_word(entries):
     """按词组排序（拼音顺序）"""
-    def get_word(entry):
-        parts = entry.split('\t')
-        return parts[0] if len(parts) > 0 else ''
+    return sort_entries(entries, ['pinyin'])
 
-    return sorted(entries, key=get_word)
 
 def write_yaml_file(file_path, header, entries, backup=True):
-    """写入排序后的 YAML 文件"""
+    """写入排序后的 YAML 文件（先写临时文件再替换），返回词条数"""
     # 备份原文件
     if backup and os.path.exists(file_path):
         backup_path = file_path + '.backup'
-        import shutil
         shutil.copy(file_path, backup_path)
         print(f"已备份原文件到: {backup_path}")
 
-    with open(file_path, 'w', encoding='utf-8') as f:
-        # 写入头部
-        f.writelines(header)
-        # 写入排序后的词条
-        for entry in entries:
-            f.write(entry + '\n')
+    count = 0
+    # 临时文件与目标在同一目录，名字不与转换程序的 result.dict.yaml.tmp（断点续转要用）重复
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(file_path) + '.', suffix='.sorting',
+                                    dir=os.path.dirname(file_path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            # 写入头部
+            f.writelines(header)
+            # 写入排序后的词条
+            for entry in entries:
+                f.write(entry + '\n')
+                count += 1
+        # mkstemp 建的文件只有本人可读写，改成与原文件（或普通新文件）相同的权限
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, tmp_path)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    print(f"排序完成！共处理 {count} 条词组")
+    return count
+
 
-    print(f"排序完成！共处理 {len(entries)} 条词组")
+def sort_file(file_path, keys, output=None, backup=True, max_entries=run_entries, tmp_dir=None, use_cache=True,
+              preview=0):
+    """流式排序整个文件，返回词条数；preview > 0 时打印排序后的前几条"""
+    output = output or file_path
+    pinyin_key = PinyinKey(use_cache) if 'pinyin' in keys else None
+    try:
+        sort_key = make_sort_key(keys, pinyin_key)
+        header = []
+        with tempfile.TemporaryDirectory(prefix='sort_result_', dir=tmp_dir) as run_dir:
+            # external_sort 返回时已读完全部输入，头部已经完整；先关闭输入文件，Windows 上才能替换它
+            with open(file_path, 'r', encoding='utf-8') as f:
+                entries = external_sort(scan_yaml(f, header), sort_key, run_dir, max_entries)
+            head = []
+
+            def written():
+                for entry in entries:
+                    if len(head) < preview:
+                        head.append(entry)
+                    yield entry
+
+            count = write_yaml_file(output, header, written(), backup=backup)
+    finally:
+        if pinyin_key is not None:
+            pinyin_key.close()
 
-def main():
+    if head:
+        print("\n排序后的前 10 条示例：")
+        for i, entry in enumerate(head, 1):
+            print(f"  {i}. {entry}")
+    return count
+
+
+def interactive(file_path):
+    """交互模式：选择排序方式后原地排序"""
     print("═══════════════════════════════════════")
     print("    result.dict.yaml 排序工具")
     print("═══════════════════════════════════════")
     print()
 
-    file_path = './result.dict.yaml'
-
     # 检查文件是否存在
     if not os.path.exists(file_path):
         print(f"错误：未找到 {file_path} 文件！")
         print("请确保该文件在当前目录下。")
-        input("\n按任意键退出...")
-        sys.exit(1)
-
-    # 读取文件
-    print("正在读取文件...")
-    header, entries = read_yaml_content(file_path)
-    print(f"读取成功！共 {len(entries)} 条词组")
-    print()
+        return
 
     # 选择排序方式
     print("请选择排序方式：")
@@ -122,44 +300,54 @@ def main():
 
     choice = input("请输入选项 (1-5): ").strip()
 
-    if choice == '1':
-        print("\n正在按编码排序...")
-        sorted_entries = sort_by_code(entries)
-    elif choice == '2':
-        print("\n正在按词组长度排序...")
-        sorted_entries = sort_by_word_length(entries)
-    elif choice == '3':
-        print("\n正在按编码长度排序...")
-        sorted_entries = sort_by_code_length(entries)
-    elif choice == '4':
-        print("\n正在按词组排序...")
-        sorted_entries = sort_by_word(entries)
-    elif choice == '5':
+    if choice == '5':
         print("\n已取消操作。")
         return
-    else:
+    if choice not in menu_keys:
         print("\n无效的选项！")
-        input("\n按任意键退出...")
         return
 
-    # 写入文件
-    write_yaml_file(file_path, header, sorted_entries, backup=True)
+    print("\n正在读取并排序...")
+    sort_file(file_path, menu_keys[choice], preview=10)
+    print("\n完成！")
+
 
-    # 显示示例
-    print("\n排序后的前 10 条示例：")
-    for i, entry in enumerate(sorted_entries[:10], 1):
-        print(f"  {i}. {entry}")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对 result.dict.yaml 的词条排序；不带 --key 时进入交互模式')
+    parser.add_argument('file', nargs='?', default=default_file, help=f'要排序的词库文件（默认 {default_file}）')
+    parser.add_argument('-k', '--key', action='append', choices=sort_keys,
+                        help='排序键，可重复指定，前面的优先，全部相同时保持原顺序；entry 为整行内容')
+    parser.add_argument('-o', '--output', help='输出文件（默认覆盖输入文件）')
+    parser.add_argument('--no-backup', action='store_true', help='不备份原文件')
+    parser.add_argument('--run-entries', type=int, default=run_entries,
+                        help=f'每段在内存中排序的词条数，超过后分段写入临时文件再归并（默认 {run_entries}）')
+    parser.add_argument('--tmp-dir', help='临时文件目录（默认系统临时目录）')
+    parser.add_argument('--no-cache', action='store_true', help='按拼音排序时不使用注音缓存')
+    args = parser.parse_args(argv)
+    if args.run_entries < 1:
+        parser.error('--run-entries 必须大于 0')
+
+    if not args.key:
+        if not sys.stdin.isatty():
+            parser.error('非交互运行时需要指定 --key')
+        try:
+            interactive(args.file)
+        except KeyboardInterrupt:
+            print("\n\n操作已取消。")
+        except Exception as e:
+            print(f"\n错误：{e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            input("\n按任意键退出...")
+        return
+
+    if not os.path.exists(args.file):
+        print(f"错误：文件 {args.file} 不存在！", file=sys.stderr)
+        sys.exit(1)
+    sort_file(args.file, args.key, output=args.output, backup=not args.no_backup,
+              max_entries=args.run_entries, tmp_dir=args.tmp_dir, use_cache=not args.no_cache)
 
-    print("\n完成！")
 
 if __name__ == '__main__':
-    try:
-        main()
-    except KeyboardInterrupt:
-        print("\n\n操作已取消。")
-    except Exception as e:
-        print(f"\n错误：{e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        input("\n按任意键退出...")
+    main()